@@ -0,0 +1,288 @@
+import argparse
+import configparser
+import functools
+import logging
+import os
+import time
+
+import logchecker_lzhfqrp
+from busted_calls import suggestBustedCalls
+from contest_rules import DEFAULT_RULES, checkRuleKeys, parseRules
+from contest_statistics import writeStatistics
+from log_files import findLogFiles, getResultsDir
+from log_index import LogIndex
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+PROFILE_PREFIX = "profile "  # [profile <name>] sections hold rules shared by several contests
+CONTEST_KEYS = ("dir", "start", "end", "qso_repeat", "crosscheck_diff", "ep", "ubn_zip", "call_suggestions", "profile")
+
+
+class Contest:
+    """
+    A contest of the batch: where the logs are and the rules they are checked with
+    """
+
+    def __init__(self, name, log_directory, start_date, end_date, qso_repeat_period=30, qso_time_difference=3,
+                 ep=False, ubn_archive=False, suggest_calls=True, use_cache=True, rules=DEFAULT_RULES):
+        """
+        :param name: Name of the contest (the section in the config file)
+        :type name: str
+        :param log_directory: Directory with the cabrillo logs (or zip file with the logs)
+        :type log_directory: str
+        :param start_date: Date and time when the contest begins (Example: "2016-12-26 0700")
+        :type start_date: str
+        :param end_date: Date and time when the contest ends (Example: "2016-12-26 0859")
+        :type end_date: str
+        :param qso_repeat_period: period after which the QSO with the same station is allowed
+        :type qso_repeat_period: int
+        :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+        :type qso_time_difference: int
+        :param ep: If this is an "ElctronProgress" contest
+        :type ep: bool
+        :param ubn_archive: Write the UBN reports into a single zip file (results/UBN.zip)
+        :type ubn_archive: bool
+        :param suggest_calls: Propose the probably intended callsign for the QSOs not found in the other log
+        :type suggest_calls: bool
+        :param use_cache: Use the parsed logs from results/parse_cache
+        :type use_cache: bool
+        :param rules: The rules of the contest (repeat period per mode/band, compared exchange, points, multipliers)
+        :type rules: ContestRules
+        """
+        if not logchecker_lzhfqrp.is_valid_date_time_format(start_date):
+            raise ValueError("[" + name + "] Incorrect start format, should be: yyyy-mm-dd hhmm")
+        if not logchecker_lzhfqrp.is_valid_date_time_format(end_date):
+            raise ValueError("[" + name + "] Incorrect end format, should be: yyyy-mm-dd hhmm")
+        if not os.path.exists(log_directory):
+            raise ValueError("[" + name + "] The logs don't exist: " + log_directory)
+
+        self.name = name
+        self.log_directory = log_directory
+        self.start_date = start_date
+        self.end_date = end_date
+        self.qso_repeat_period = qso_repeat_period
+        self.qso_time_difference = qso_time_difference
+        self.ep = ep
+        self.ubn_archive = ubn_archive
+        self.suggest_calls = suggest_calls
+        self.rules = rules
+
+        self.results_dir = getResultsDir(log_directory)
+        self.cache_dir = os.path.join(self.results_dir, "parse_cache") if use_cache else None
+        self.filenames = []
+        self.participants = {}  #:type : dict of Participant
+        self.log_index = None  #:type : LogIndex
+
+
+    def getSummary(self):
+        """
+        :return: Number of logs, QSOs, valid QSOs and invalid QSOs
+        :rtype: (int, int, int, int)
+        """
+        qsos = sum(p.totalQsoCount() for p in self.participants.values())
+        valid = sum(p.validQsoCount() for p in self.participants.values())
+        return len(self.participants), qsos, valid, qsos - valid
+
+
+def loadContests(config_filename, use_cache=True):
+    """
+    Reads the contests from the config file. Each section is a contest:
+
+    [Plovdiv-2016]
+    dir = docs/Plovdiv-2016-Logove
+    start = 2016-08-20 0800
+    end = 2016-08-20 1159
+    qso_repeat = 30
+    crosscheck_diff = 3
+
+    Optional keys: ep, ubn_zip, call_suggestions (yes/no) and the contest rules (repeat.PH = 20, points.CW = 3,
+    multiplier = EP... see contest_rules.parseRules()). The rules shared by several contests can be written into a
+    [profile <name>] section and used with "profile = <name>"; the keys in [DEFAULT] apply to all the contests. Relative
+    paths are relative to the config file.
+
+    :param config_filename: Path to the config file
+    :type config_filename: str
+    :param use_cache: Use the parsed logs from results/parse_cache
+    :type use_cache: bool
+    :return: The contests in the order of the config file
+    :rtype: list of Contest
+    """
+    # [DEFAULT] is read as a normal section - the keys are applied below in the order DEFAULT, profile, contest
+    config = configparser.ConfigParser(interpolation=None, default_section=None)
+    if not config.read(config_filename, encoding="utf-8"):
+        raise ValueError("Can't read the config file: " + config_filename)
+    base_dir = os.path.dirname(os.path.abspath(config_filename))
+
+    contests = []
+    for name in config.sections():
+        if name == "DEFAULT" or name.startswith(PROFILE_PREFIX):
+            continue
+
+        values = dict(config["DEFAULT"]) if config.has_section("DEFAULT") else {}
+        profile = config[name].get("profile", values.get("profile"))
+        if profile is not None:
+            if not config.has_section(PROFILE_PREFIX + profile):
+                raise ValueError("[" + name + "] Unknown profile: " + profile)
+            values.update(config[PROFILE_PREFIX + profile])
+        values.update(config[name])
+
+        for key in ("dir", "start", "end"):
+            if key not in values:
+                raise ValueError("[" + name + "] " + key + " is missing")
+        checkRuleKeys(values, "[" + name + "]", CONTEST_KEYS)
+
+        try:
+            rules = (int(values.get("qso_repeat", 30)), int(values.get("crosscheck_diff", 3)),
+                     _toBool(values.get("ep", "no")), _toBool(values.get("ubn_zip", "no")),
+                     _toBool(values.get("call_suggestions", "yes")))
+            contest_rules = parseRules(values)
+        except (KeyError, ValueError) as e:
+            raise ValueError("[" + name + "] Incorrect value: " + str(e))
+
+        contests.append(Contest(name, os.path.join(base_dir, values["dir"]), values["start"], values["end"], *rules,
+                                use_cache=use_cache, rules=contest_rules))
+
+    return contests
+
+
+def _toBool(value):
+    return configparser.ConfigParser.BOOLEAN_STATES[value.lower()]
+
+
+def parseContests(contests, jobs=1):
+    """
+    Parses the logs of all the contests. With jobs > 1 the files of all the contests are parsed in one pool of worker
+    processes, so the workers don't wait for the last files of each contest.
+
+    :type contests: list of Contest
+    :param jobs: Number of worker processes
+    :type jobs: int
+    """
+    for contest in contests:
+        contest.filenames = list(findLogFiles(contest.log_directory))
+        if contest.cache_dir is not None and not os.path.exists(contest.results_dir):
+            os.makedirs(contest.results_dir)
+
+    if jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            file_count = sum(len(contest.filenames) for contest in contests)
+            chunksize = max(1, file_count // (jobs * 4 * len(contests)))
+            # All the files are submitted before the first result is read
+            parsed = [executor.map(functools.partial(logchecker_lzhfqrp.parseLogFile, cache_dir=contest.cache_dir),
+                                   contest.filenames, chunksize=chunksize) for contest in contests]
+            for contest, parsed_logs in zip(contests, parsed):
+                _addParticipants(contest, logchecker_lzhfqrp.collectParsedLogs(contest.filenames, parsed_logs))
+    else:
+        for contest in contests:
+            _addParticipants(contest, logchecker_lzhfqrp.parseLogFiles(contest.filenames, 1, contest.cache_dir))
+
+
+def _addParticipants(contest, participants):
+    for participant in participants:
+        if len(participant.callsign):
+            contest.participants[participant.callsign] = participant
+
+
+def checkContests(contests, jobs=1):
+    """
+    Checks the logs of all the contests (see logchecker_lzhfqrp.checkLog()). With jobs > 1 the logs of all the contests
+    are checked in one pool of worker processes.
+
+    :type contests: list of Contest
+    :param jobs: Number of worker processes
+    :type jobs: int
+    """
+    for contest in contests:
+        contest.log_index = LogIndex(contest.participants)
+        logchecker_lzhfqrp.rejectQsoOutdsideTheContest(contest.participants, contest.start_date, contest.end_date)
+
+    if jobs > 1:
+        logchecker_lzhfqrp.checkContestsInParallel([(contest.participants, contest.qso_repeat_period,
+                                                     contest.qso_time_difference, contest.log_index, contest.rules)
+                                                    for contest in contests if contest.participants], jobs)
+    else:
+        for contest in contests:
+            for p in contest.participants:
+                logchecker_lzhfqrp.checkParticipant(contest.participants, p, contest.qso_repeat_period,
+                                                    contest.qso_time_difference, contest.log_index,
+                                                    rules=contest.rules)
+
+
+def writeContestResults(contest):
+    """
+    Proposes the busted calls and writes the results, the UBN reports and the statistics of the contest
+
+    :type contest: Contest
+    """
+    if contest.suggest_calls:
+        suggestBustedCalls(contest.participants, contest.qso_time_difference, contest.log_index, rules=contest.rules)
+
+    if not os.path.exists(contest.results_dir):
+        os.makedirs(contest.results_dir)
+    if not contest.ep:
+        logchecker_lzhfqrp.writeResults(contest.participants, contest.results_dir, ubn_archive=contest.ubn_archive,
+                                        rules=contest.rules)
+    else:
+        logchecker_lzhfqrp.writeResultsElectronProgress(contest.participants, contest.results_dir,
+                                                        ubn_archive=contest.ubn_archive, rules=contest.rules)
+    writeStatistics(contest.participants, contest.results_dir, contest.start_date, contest.end_date)
+
+
+def formatSummary(contests, seconds):
+    """
+    :param seconds: Wall time of the whole batch
+    :type seconds: float
+    :return: Table with the number of logs and QSOs of each contest
+    :rtype: str
+    """
+    lines = ["{:<24}{:>7}{:>9}{:>9}{:>9}  {}".format("Contest", "Logs", "QSOs", "Valid", "Invalid", "Results")]
+    for contest in contests:
+        lines.append("{:<24}{:>7}{:>9}{:>9}{:>9}  {}".format(contest.name, *contest.getSummary(), contest.results_dir))
+    lines.append("Checked {} contests in {:.1f}s".format(len(contests), seconds))
+    return "\n".join(lines)
+
+
+def main(config_filename, jobs=1, names=None, use_cache=True):
+    """
+    Checks all the contests in the config file (see loadContests()) and prints a summary of each contest
+
+    :param config_filename: Path to the config file
+    :type config_filename: str
+    :param jobs: Number of worker processes shared by all the contests
+    :type jobs: int
+    :param names: If supplied only these contests are checked
+    :type names: list of str
+    :param use_cache: Use the parsed logs from results/parse_cache
+    :type use_cache: bool
+    """
+    begin = time.perf_counter()
+    contests = loadContests(config_filename, use_cache)
+    if names:
+        unknown = set(names) - {contest.name for contest in contests}
+        if unknown:
+            raise ValueError("Unknown contest: " + ", ".join(sorted(unknown)))
+        contests = [contest for contest in contests if contest.name in names]
+
+    parseContests(contests, jobs)
+    checkContests(contests, jobs)
+    for contest in contests:
+        writeContestResults(contest)
+
+    print(formatSummary(contests, time.perf_counter() - begin))
+
+
+if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()
+    logchecker_lzhfqrp.setupLogging()
+
+    parser = argparse.ArgumentParser(description='Checks the logs of several contests listed in a config file.')
+    parser.add_argument("--config", type=str, required=True, help="Config file with the contests (see contests_example.ini). Example: --config=\"C:\season-2017.ini\"")
+    parser.add_argument("--jobs", type=int, default=1, required=False, help="Number of worker processes shared by all the contests. Default is 1. Example: --jobs=8")
+    parser.add_argument("--contest", type=str, nargs="+", default=None, required=False, help="Check only these contests (sections of the config file). Example: --contest Plovdiv-2016 EP-2016")
+    parser.add_argument("--no_cache", action="store_true", required=False, help="Parse all the logs again instead of using the parsed logs from results/parse_cache. Example: --no_cache")
+    args = parser.parse_args()
+
+    main(args.config, args.jobs, args.contest, not args.no_cache)
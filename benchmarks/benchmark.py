@@ -0,0 +1,177 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from contest_generator import ContestGenerator
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+CONTEST_START = "2016-08-20 0800"
+CONTEST_END = "2016-08-20 1159"
+CONTEST_DURATION_MINS = 240
+
+DEFAULT_SIZES = [50, 200, 1000, 5000, 10000]
+
+
+def getPeakMemoryMb():
+    """
+    :return: Peak resident memory of the current process in MB (None if not supported by the OS)
+    :rtype: float
+    """
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 1)  # bytes
+    return round(peak / 1024, 1)  # kilobytes
+
+
+def runStages(logs_dir, engine="python", jobs=1):
+    """
+    Runs the stages of the log check (as in logchecker_lzhfqrp.main()) one by one.
+
+    :param logs_dir: Directory with the cabrillo logs
+    :type logs_dir: str
+    :param engine: "python" or "numpy"
+    :type engine: str
+    :param jobs: Number of worker processes
+    :type jobs: int
+    :return: {stage: {"seconds": wall time, "peak_rss_mb": peak memory of the process after the stage}} and counters
+    :rtype: dict
+    """
+    sys.path.insert(0, ROOT_DIR)
+    import logchecker_lzhfqrp
+    from busted_calls import suggestBustedCalls
+    from contest_statistics import writeStatistics
+    from log_index import LogIndex
+
+    stages = {}
+
+    def timeStage(name, function):
+        begin = time.perf_counter()
+        result = function()
+        stages[name] = {"seconds": round(time.perf_counter() - begin, 4), "peak_rss_mb": getPeakMemoryMb()}
+        return result
+
+    results_dir = os.path.join(logs_dir, "results")
+    os.makedirs(results_dir, exist_ok=True)
+
+    participants = timeStage("parse", lambda: logchecker_lzhfqrp.parseLogs(logs_dir, jobs))
+
+    log_index = timeStage("index", lambda: LogIndex(participants))
+    if engine == "numpy":
+        import columnar_check
+        timeStage("check", lambda: columnar_check.checkLog(participants, CONTEST_START, CONTEST_END))
+    else:
+        timeStage("check", lambda: logchecker_lzhfqrp.checkLog(participants, CONTEST_START, CONTEST_END,
+                                                               log_index=log_index, jobs=jobs))
+    timeStage("busted_calls", lambda: suggestBustedCalls(participants, 3, log_index))
+
+    timeStage("write", lambda: logchecker_lzhfqrp.writeResults(participants, results_dir))
+    timeStage("statistics", lambda: writeStatistics(participants, results_dir, CONTEST_START, CONTEST_END))
+
+    return {"stages": stages,
+            "participants": len(participants),
+            "qsos": sum(len(p.log) for p in participants.values()),
+            "valid_qsos": sum(p.validQsoCount() for p in participants.values())}
+
+
+def runSize(work_dir, stations, args):
+    """
+    Generates a contest with the supplied number of stations and checks it in a new process (so that the peak memory
+    of each size is measured separately).
+
+    :return: The result of runStages() together with the parameters of the contest
+    :rtype: dict
+    """
+    logs_dir = os.path.join(work_dir, "contest-" + str(stations))
+    generator = ContestGenerator(stations=stations, qsos_per_log=args.qsos, duration_mins=CONTEST_DURATION_MINS,
+                                 seed=args.seed, busted_exchange_rate=args.busted, dupe_rate=args.dupes,
+                                 missing_qso_rate=args.missing_qsos, missing_log_rate=args.missing_logs)
+    logs = generator.generate(logs_dir)
+
+    output = os.path.join(work_dir, "result-" + str(stations) + ".json")
+    subprocess.run([sys.executable, os.path.abspath(__file__), "--run_stages=" + logs_dir, "--output=" + output,
+                    "--engine=" + args.engine, "--jobs=" + str(args.jobs)],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    with open(output) as f:
+        result = json.load(f)
+    result.update({"stations": stations, "logs": logs})
+    return result
+
+
+def getLabel():
+    """
+    :return: The current git commit (or "unknown" if git is not available)
+    :rtype: str
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL).decode("ascii").strip()
+    except Exception:
+        return "unknown"
+
+
+def main(args):
+    label = args.label or getLabel()
+    report = {"label": label,
+              "date": datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "parameters": {"qsos_per_log": args.qsos, "seed": args.seed, "busted": args.busted, "dupes": args.dupes,
+                             "missing_qsos": args.missing_qsos, "missing_logs": args.missing_logs,
+                             "engine": args.engine, "jobs": args.jobs},
+              "results": []}
+
+    work_dir = tempfile.mkdtemp(prefix="logchecker-benchmark-")
+    try:
+        for stations in args.sizes:
+            result = runSize(work_dir, stations, args)
+            report["results"].append(result)
+            print("{:>6} logs {:>9} QSOs  ".format(result["logs"], result["qsos"]) +
+                  "  ".join("{} {:.2f}s".format(name, stage["seconds"]) for name, stage in result["stages"].items()) +
+                  "  peak {} MB".format(max((s["peak_rss_mb"] or 0) for s in result["stages"].values())))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, label + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Results written to: " + output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measures the time and memory of each stage of the log check on synthetic contests.')
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, required=False, help="Number of stations of each contest. Default is 50 200 1000 5000 10000. Example: --sizes 50 500")
+    parser.add_argument("--qsos", type=int, default=300, required=False, help="Average number of QSOs per log. Default is 300. Example: --qsos=500")
+    parser.add_argument("--seed", type=int, default=1, required=False, help="Seed of the random generator. Default is 1. Example: --seed=7")
+    parser.add_argument("--busted", type=float, default=0.02, required=False, help="Probability of busted exchange. Default is 0.02. Example: --busted=0.05")
+    parser.add_argument("--dupes", type=float, default=0.01, required=False, help="Probability of dupe contact. Default is 0.01. Example: --dupes=0.02")
+    parser.add_argument("--missing_qsos", type=float, default=0.01, required=False, help="Probability of QSO missing in one of the logs. Default is 0.01. Example: --missing_qsos=0.02")
+    parser.add_argument("--missing_logs", type=float, default=0.05, required=False, help="Part of the stations that don't send a log. Default is 0.05. Example: --missing_logs=0.1")
+    parser.add_argument("--engine", type=str, default="python", choices=["python", "numpy"], required=False, help="Log checking engine. Default is python. Example: --engine=numpy")
+    parser.add_argument("--jobs", type=int, default=1, required=False, help="Number of worker processes. Default is 1. Example: --jobs=8")
+    parser.add_argument("--label", type=str, default=None, required=False, help="Name of the results. Default is the current git commit. Example: --label=before-fix")
+    parser.add_argument("--output", type=str, default=None, required=False, help="JSON file with the results. Default is benchmarks/results/<label>.json")
+    parser.add_argument("--run_stages", type=str, default=None, required=False, help=argparse.SUPPRESS)  # Used by runSize()
+    args = parser.parse_args()
+
+    if args.run_stages:
+        result = runStages(args.run_stages, args.engine, args.jobs)
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+    else:
+        main(args)
@@ -0,0 +1,115 @@
+import argparse
+import filecmp
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from contest_generator import ContestGenerator
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONTEST_START = "2016-08-20 0800"
+CONTEST_END = "2016-08-20 1159"
+CONTEST_DURATION_MINS = 240
+
+# The engines that must give the same results as the default one. The busted calls are not proposed by --out_of_core,
+# so all of them run with --no_call_suggestions. --pair_matching is not compared - it gives other results on purpose
+# (ERROR_PARTNER_DUPE, ERROR_PARTNER_DATE_TIME).
+ENGINES = {"jobs": ["--jobs={jobs}"],
+           "numpy": ["--engine=numpy"],
+           "out_of_core": ["--out_of_core", "--memory_mb=1"]}  # The smallest memory - the sorted runs spill to disk
+
+IGNORED_FILES = ("parse_cache", "checked_state.pickle")
+
+
+def runEngine(logs_dir, work_dir, name, engine_args):
+    """
+    Checks a copy of the logs with logchecker_lzhfqrp.py in a new process
+
+    :param logs_dir: Directory with the cabrillo logs
+    :type logs_dir: str
+    :param work_dir: Where the copy of the logs is made
+    :type work_dir: str
+    :param name: Name of the engine (the name of the copy)
+    :type name: str
+    :param engine_args: The command line arguments of the engine
+    :type engine_args: list of str
+    :return: The results dir of the check
+    :rtype: str
+    """
+    engine_dir = os.path.join(work_dir, name)
+    shutil.copytree(logs_dir, engine_dir)
+    subprocess.run([sys.executable, os.path.join(ROOT_DIR, "logchecker_lzhfqrp.py"), "--start=" + CONTEST_START,
+                    "--end=" + CONTEST_END, "--dir=" + engine_dir, "--no_call_suggestions"] + engine_args,
+                   check=True, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return os.path.join(engine_dir, "results")
+
+
+def compareResults(expected_dir, actual_dir):
+    """
+    Compares the results of two checks: results.csv, the UBN reports and the statistics
+
+    :param expected_dir: The results dir of the default engine
+    :type expected_dir: str
+    :param actual_dir: The results dir of the compared engine
+    :type actual_dir: str
+    :return: The files (relative to the results dir) that differ or exist only in one of the dirs
+    :rtype: list of str
+    """
+    differences = []
+    comparison = filecmp.dircmp(expected_dir, actual_dir, ignore=list(IGNORED_FILES))
+    pending = [("", comparison)]
+    while pending:
+        path, comparison = pending.pop()
+        differences.extend(os.path.join(path, name) for name in comparison.left_only + comparison.right_only)
+        # dircmp compares only the size and the time - the contents are compared here
+        match, mismatch, errors = filecmp.cmpfiles(comparison.left, comparison.right, comparison.common_files,
+                                                   shallow=False)
+        differences.extend(os.path.join(path, name) for name in mismatch + errors)
+        pending.extend((os.path.join(path, name), sub) for name, sub in comparison.subdirs.items())
+
+    return sorted(differences)
+
+
+def main(args):
+    engines = {name: [arg.format(jobs=args.jobs) for arg in ENGINES[name]] for name in args.engines}
+    if "numpy" in engines:
+        try:
+            import numpy
+        except ImportError:
+            print("numpy is not installed - the numpy engine is not compared")
+            del engines["numpy"]
+
+    work_dir = tempfile.mkdtemp(prefix="logchecker-engines-")
+    try:
+        logs_dir = os.path.join(work_dir, "logs")
+        generator = ContestGenerator(stations=args.stations, qsos_per_log=args.qsos,
+                                     duration_mins=CONTEST_DURATION_MINS, seed=args.seed)
+        print("Generated logs: " + str(generator.generate(logs_dir)))
+
+        expected_dir = runEngine(logs_dir, work_dir, "default", [])
+        failed = []
+        for name, engine_args in engines.items():
+            differences = compareResults(expected_dir, runEngine(logs_dir, work_dir, name, engine_args))
+            print("{:<12} {}".format(name, "same results" if not differences else
+                                     str(len(differences)) + " different files: " + ", ".join(differences[:10])))
+            if differences:
+                failed.append(name)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Checks a synthetic contest with each engine and compares the results with the default engine.')
+    parser.add_argument("--stations", type=int, default=200, required=False, help="Number of stations. Default is 200. Example: --stations=1000")
+    parser.add_argument("--qsos", type=int, default=300, required=False, help="Average number of QSOs per log. Default is 300. Example: --qsos=500")
+    parser.add_argument("--seed", type=int, default=1, required=False, help="Seed of the random generator. Default is 1. Example: --seed=7")
+    parser.add_argument("--jobs", type=int, default=4, required=False, help="Number of worker processes of the jobs engine. Default is 4. Example: --jobs=8")
+    parser.add_argument("--engines", type=str, nargs="+", default=list(ENGINES), choices=list(ENGINES), required=False, help="The compared engines. Default are all. Example: --engines jobs numpy")
+    args = parser.parse_args()
+
+    sys.exit(main(args))
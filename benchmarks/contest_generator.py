@@ -0,0 +1,162 @@
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+
+class ContestGenerator:
+    """
+    Generates synthetic cabrillo logs of a LZ contest ([serial] + [first 3 digits of the last received serial]).
+
+    The contacts are made between random pairs of stations at random times. Both sides of each contact are written into
+    the logs and then errors are introduced with the configured probabilities.
+    """
+
+    def __init__(self, stations=50, qsos_per_log=300, start="2016-08-20 0800", duration_mins=240, seed=1,
+                 busted_exchange_rate=0.02, dupe_rate=0.01, missing_qso_rate=0.01, missing_log_rate=0.05,
+                 time_offset_mins=1):
+        """
+        :param stations: Number of stations taking part in the contest
+        :type stations: int
+        :param qsos_per_log: Average number of QSOs in a log
+        :type qsos_per_log: int
+        :param start: Contest start time (format "yyyy-mm-dd hhmm")
+        :type start: str
+        :param duration_mins: Contest duration in minutes
+        :type duration_mins: int
+        :param seed: Seed of the random generator (the same seed gives the same logs)
+        :type seed: int
+        :param busted_exchange_rate: Probability that the received exchange is written wrong
+        :type busted_exchange_rate: float
+        :param dupe_rate: Probability that a contact is repeated within a few minutes
+        :type dupe_rate: float
+        :param missing_qso_rate: Probability that one of the sides didn't write the contact in its log
+        :type missing_qso_rate: float
+        :param missing_log_rate: Part of the stations that don't send a log
+        :type missing_log_rate: float
+        :param time_offset_mins: Maximum clock offset (in minutes) of the stations
+        :type time_offset_mins: int
+        """
+        self.stations = stations
+        self.qsos_per_log = qsos_per_log
+        self.start = datetime.strptime(start, "%Y-%m-%d %H%M")
+        self.duration_mins = duration_mins
+        self.random = random.Random(seed)
+        self.busted_exchange_rate = busted_exchange_rate
+        self.dupe_rate = dupe_rate
+        self.missing_qso_rate = missing_qso_rate
+        self.missing_log_rate = missing_log_rate
+        self.time_offset_mins = time_offset_mins
+
+
+    def getCallsigns(self):
+        """
+        :return: Unique callsigns of the stations (LZ0AA, LZ0AB... LZ1AA...)
+        :rtype: list of str
+        """
+        letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+        callsigns = []
+        for i in range(self.stations):
+            suffix = ""
+            n = i // 10
+            for _ in range(3 if self.stations > 6760 else 2):
+                suffix = letters[n % 26] + suffix
+                n //= 26
+            callsigns.append("LZ" + str(i % 10) + suffix)
+        return callsigns
+
+
+    def generate(self, to_dir):
+        """
+        Writes the logs into the supplied directory (one .CBR file per station that sends a log)
+
+        :param to_dir: Output directory
+        :type to_dir: str
+        :return: Number of written logs
+        :rtype: int
+        """
+        rnd = self.random
+        callsigns = self.getCallsigns()
+        offsets = [rnd.randint(-self.time_offset_mins, self.time_offset_mins) for _ in callsigns]
+
+        # Contacts (minute, station a, station b, mode) - each station takes part in ~qsos_per_log of them
+        contacts = []
+        for _ in range(self.stations * self.qsos_per_log // 2):
+            a, b = rnd.sample(range(self.stations), 2)
+            minute = rnd.randrange(self.duration_mins)
+            mode = "CW" if rnd.random() < 0.7 else "SSB"
+            contacts.append((minute, a, b, mode))
+            if rnd.random() < self.dupe_rate:
+                contacts.append((min(minute + rnd.randint(1, 10), self.duration_mins - 1), a, b, mode))
+        contacts.sort()
+
+        serials = [0] * self.stations
+        last_received = [0] * self.stations
+        logs = [[] for _ in callsigns]
+
+        for minute, a, b, mode in contacts:
+            serials[a] += 1
+            serials[b] += 1
+            sent_a = (serials[a], last_received[a])
+            sent_b = (serials[b], last_received[b])
+            last_received[a] = serials[b]
+            last_received[b] = serials[a]
+
+            freq = 3510 + rnd.randrange(50) if mode == "CW" else 3600 + rnd.randrange(175)
+            for me, him, sent, received in ((a, b, sent_a, sent_b), (b, a, sent_b, sent_a)):
+                if rnd.random() < self.missing_qso_rate:
+                    continue
+                if rnd.random() < self.busted_exchange_rate:
+                    received = (received[0] + rnd.choice((-10, -1, 1, 10, 100)), received[1])
+                logs[me].append((minute + offsets[me], freq, mode, callsigns[me], sent, callsigns[him], received))
+
+        os.makedirs(to_dir, exist_ok=True)
+
+        written = 0
+        for i, callsign in enumerate(callsigns):
+            if rnd.random() < self.missing_log_rate:
+                continue
+            with open(os.path.join(to_dir, callsign + ".CBR"), "w", encoding="ascii") as f:
+                f.write(self.formatLog(callsign, logs[i]))
+            written += 1
+
+        return written
+
+
+    def formatLog(self, callsign, qsos):
+        """
+        :return: The log in cabrillo format
+        :rtype: str
+        """
+        lines = ["START-OF-LOG: 3.0",
+                 "CALLSIGN: " + callsign,
+                 "CONTEST: SYNTHETIC",
+                 "CATEGORY: SINGLE-OP 80M LOW MIXED",
+                 "NAME: Synthetic " + callsign]
+
+        for minute, freq, mode, call, sent, his_call, received in qsos:
+            date_time = self.start + timedelta(minutes=minute)
+            lines.append("QSO: {:>5} {:<3} {} {:<13} {:03d} {:03d}  {:<13} {:03d} {:03d}".format(
+                freq, mode, date_time.strftime("%Y-%m-%d %H%M"), call, sent[0], sent[1], his_call,
+                received[0], received[1]))
+
+        lines.append("END-OF-LOG:")
+        return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generates synthetic logs of a LZ contest.')
+    parser.add_argument("--dir", type=str, required=True, help="Output directory. Example: --dir=\"C:\Synthetic\"")
+    parser.add_argument("--stations", type=int, default=50, required=False, help="Number of stations. Default is 50. Example: --stations=1000")
+    parser.add_argument("--qsos", type=int, default=300, required=False, help="Average number of QSOs per log. Default is 300. Example: --qsos=500")
+    parser.add_argument("--seed", type=int, default=1, required=False, help="Seed of the random generator. Default is 1. Example: --seed=7")
+    parser.add_argument("--busted", type=float, default=0.02, required=False, help="Probability of busted exchange. Default is 0.02. Example: --busted=0.05")
+    parser.add_argument("--dupes", type=float, default=0.01, required=False, help="Probability of dupe contact. Default is 0.01. Example: --dupes=0.02")
+    parser.add_argument("--missing_qsos", type=float, default=0.01, required=False, help="Probability of QSO missing in one of the logs. Default is 0.01. Example: --missing_qsos=0.02")
+    parser.add_argument("--missing_logs", type=float, default=0.05, required=False, help="Part of the stations that don't send a log. Default is 0.05. Example: --missing_logs=0.1")
+    args = parser.parse_args()
+
+    generator = ContestGenerator(stations=args.stations, qsos_per_log=args.qsos, seed=args.seed,
+                                 busted_exchange_rate=args.busted, dupe_rate=args.dupes,
+                                 missing_qso_rate=args.missing_qsos, missing_log_rate=args.missing_logs)
+    print("Written logs: " + str(generator.generate(args.dir)))
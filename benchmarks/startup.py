@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from contest_generator import ContestGenerator
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import of the modules + parsing of the first log must stay below this time (in seconds)
+STARTUP_BUDGET_SECONDS = 0.2
+
+# Runs in a new interpreter. The current dir is not the project dir - the import must not depend on it.
+CHILD_CODE = """
+import json, sys, time
+begin = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import logchecker_lzhfqrp
+imported = time.perf_counter()
+logchecker_lzhfqrp.parseLogFile(sys.argv[2])
+parsed = time.perf_counter()
+print(json.dumps({"import": imported - begin, "first_log": parsed - imported}))
+"""
+
+
+def measureStartup(log_filename, runs=10):
+    """
+    Measures the time to the first parsed log in new interpreters
+
+    :param log_filename: The log that is parsed
+    :type log_filename: str
+    :param runs: Number of measurements (the median is reported)
+    :type runs: int
+    :return: Median times in seconds: "interpreter" (empty python), "import", "first_log" and "total" (wall time of the
+     whole process)
+    :rtype: dict
+    """
+    samples = {"interpreter": [], "import": [], "first_log": [], "total": []}
+    cwd = os.path.dirname(log_filename)
+
+    for _ in range(runs):
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True, cwd=cwd)
+        samples["interpreter"].append(time.perf_counter() - begin)
+
+        begin = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", CHILD_CODE, ROOT_DIR, log_filename], check=True, cwd=cwd,
+                                stdout=subprocess.PIPE).stdout
+        samples["total"].append(time.perf_counter() - begin)
+        child = json.loads(output.decode("ascii").splitlines()[-1])
+        samples["import"].append(child["import"])
+        samples["first_log"].append(child["first_log"])
+
+    return {name: round(statistics.median(values), 4) for name, values in samples.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measures the time from the start of the program to the first parsed log.')
+    parser.add_argument("--runs", type=int, default=10, required=False, help="Number of measurements. Default is 10. Example: --runs=20")
+    parser.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS, required=False, help="Allowed import + first log time in seconds. Default is 0.2. Example: --budget=0.3")
+    parser.add_argument("--output", type=str, default=None, required=False, help="Write the result into JSON file. Example: --output=startup.json")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="logchecker-startup-")
+    try:
+        ContestGenerator(stations=2, qsos_per_log=300, missing_log_rate=0).generate(work_dir)
+        result = measureStartup(os.path.join(work_dir, sorted(os.listdir(work_dir))[0]), args.runs)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    startup = result["import"] + result["first_log"]
+    result.update({"budget": args.budget, "within_budget": startup <= args.budget})
+    print("interpreter {interpreter:.3f}s  import {import:.3f}s  first log {first_log:.3f}s  total {total:.3f}s".format(
+        **result))
+    print("import + first log: {:.3f}s (budget {:.3f}s)".format(startup, args.budget))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    sys.exit(0 if result["within_budget"] else 1)
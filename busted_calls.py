@@ -0,0 +1,281 @@
+from bisect import bisect_left, bisect_right
+
+from qso import Qso
+from log_index import LogIndex
+from contest_rules import DEFAULT_RULES
+
+
+def editDistance(a, b, max_distance):
+    """
+    Levenshtein distance of the two strings
+
+    :type a: str
+    :type b: str
+    :param max_distance: The calculation is stopped when the distance becomes bigger than this value
+    :type max_distance: int
+    :return: The distance or max_distance+1 if it is bigger than max_distance
+    :rtype: int
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+
+    return min(previous[-1], max_distance + 1)
+
+
+class CallsignIndex:
+    """
+    BK-tree of callsigns. Finds the callsigns within a given edit distance without comparing with all of them.
+    """
+
+    def __init__(self, callsigns=()):
+        self.root = None  # [callsign, {distance: child node}]
+        for callsign in callsigns:
+            self.add(callsign)
+
+
+    def add(self, callsign):
+        """
+        :type callsign: str
+        """
+        if self.root is None:
+            self.root = [callsign, {}]
+            return
+
+        node = self.root
+        while True:
+            distance = editDistance(callsign, node[0], len(callsign) + len(node[0]))
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [callsign, {}]
+                return
+            node = child
+
+
+    def find(self, callsign, max_distance):
+        """
+        :type callsign: str
+        :param max_distance: Maximum edit distance
+        :type max_distance: int
+        :return: The similar callsigns sorted by distance (and callsign). The callsign itself is not returned.
+        :rtype: list of (int, str)
+        """
+        found = []
+        nodes = [self.root] if self.root is not None else []
+
+        while nodes:
+            node = nodes.pop()
+            # The distances to the children are exact - only the children that can be within max_distance are visited
+            distance = editDistance(callsign, node[0], max_distance + max(node[1], default=0))
+            if 0 < distance <= max_distance:
+                found.append((distance, node[0]))
+            for child_distance, child in node[1].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    nodes.append(child)
+
+        return sorted(found)
+
+
+class HeardIndex:
+    """
+    The QSOs of all logs grouped by the worked station (his_call) and sorted by time. Answers "who logged this station
+    around this time" - the stations that could have been meant by a busted call.
+
+    The index can be kept up to date when a log is added or replaced (see update()) instead of building it again.
+    """
+
+    def __init__(self, log_index):
+        """
+        :param log_index: Cross-check index of the logs (its already sorted parts are merged)
+        :type log_index: LogIndex
+        """
+        self.index = {}  #:type : dict of {his_call: (list of Qso.minute, list of Qso, list of position in the log)}
+        self.worked = {}  #:type : dict of {his_call: number of the stations that logged it}
+        self.logs = {}  #:type : dict of {callsign: the indexed part of LogIndex.index}
+        self.unique_calls = None  # BK-tree of the callsigns without log that were logged by several stations
+
+        heard = {}
+        for callsign, entries in log_index.index.items():
+            self.logs[callsign] = entries
+            for his_call, (times, qsos) in entries.items():
+                heard.setdefault(his_call, []).extend((minute, qso, position)
+                                                      for minute, (position, qso) in zip(times, qsos))
+
+        for his_call, qsos in heard.items():
+            self._setQsos(his_call, qsos)
+
+
+    def _setQsos(self, his_call, qsos):
+        """
+        :param qsos: (Qso.minute, Qso, position in the log) of all QSOs with his_call
+        :type qsos: list of (int, Qso, int)
+        """
+        if not qsos:
+            self.index.pop(his_call, None)
+            self.worked.pop(his_call, None)
+            return
+
+        # Sorted by owner and position too - the order must not depend on the order in which the logs were indexed
+        qsos.sort(key=lambda entry: (entry[0], entry[1].call, entry[2]))
+        self.index[his_call] = ([entry[0] for entry in qsos], [entry[1] for entry in qsos],
+                                [entry[2] for entry in qsos])
+        self.worked[his_call] = len({entry[1].call for entry in qsos})
+
+
+    def update(self, log_index, callsign):
+        """
+        Replaces the QSOs of a log with its current part of the log index. Only the QSOs with the stations worked in the
+        old or the new log are sorted again.
+
+        :param log_index: Cross-check index of the logs (already updated with the log)
+        :type log_index: LogIndex
+        :param callsign: The added, replaced or removed log
+        :type callsign: str
+        """
+        old = self.logs.pop(callsign, {})
+        new = log_index.index.get(callsign, {})
+        if callsign in log_index.index:
+            self.logs[callsign] = new
+
+        for his_call in set(old) | set(new):
+            removed = {id(qso) for _, qso in old[his_call][1]} if his_call in old else set()
+            times, qsos, positions = self.index.get(his_call, ((), (), ()))
+            entries = [entry for entry in zip(times, qsos, positions) if id(entry[1]) not in removed]
+            if his_call in new:
+                entries.extend((minute, qso, position) for minute, (position, qso) in zip(*new[his_call]))
+            self._setQsos(his_call, entries)
+
+        self.unique_calls = None
+
+
+    def getUniqueCalls(self, participants):
+        """
+        :return: BK-tree of the callsigns without log that were logged by at least two stations
+        :rtype: CallsignIndex
+        """
+        if self.unique_calls is None:
+            worked = self.worked
+            self.unique_calls = CallsignIndex(sorted(c for c in worked if worked[c] >= 2 and c not in participants))
+        return self.unique_calls
+
+
+    def getQsos(self, his_call, minute, time_delta):
+        """
+        :return: The QSOs with "his_call" from all the logs for which the time interval to "minute" is less than
+         time_delta
+        :rtype: list of Qso
+        """
+        entries = self.index.get(his_call)
+        if entries is None:
+            return []
+
+        times, qsos, _ = entries
+        return qsos[bisect_right(times, minute - time_delta):bisect_left(times, minute + time_delta)]
+
+
+def suggestBustedCalls(participants, qso_time_difference, log_index=None, callsigns=None, max_distance=2,
+                       heard=None, rules=DEFAULT_RULES):
+    """
+    Proposes the probably intended station for the QSOs marked with ERROR_NOT_IN_LOG or ERROR_PARTNER_LOG_MISSING. The
+    proposal is written into error_info (and so into the UBN report).
+
+    A station is proposed when its callsign is similar to his_call and its log has a QSO with this station within the
+    cross-check time window where at least one of the exchanges matches (that QSO is shown too). Only the few QSOs in
+    the time window are compared, not all the callsigns. Callsigns without log are proposed only when his_call was
+    logged by a single station and the similar callsign by several (searched in a BK-tree).
+
+    :param participants:
+    :type participants: dict of Participant
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param log_index: Cross-check index of the logs. Built from the participants if not supplied.
+    :type log_index: LogIndex
+    :param callsigns: If supplied only the logs of these participants get proposals
+    :type callsigns: set of str
+    :param max_distance: Maximum edit distance between his_call and the proposed callsign
+    :type max_distance: int
+    :param heard: Index of the QSOs by the worked station kept up to date by the caller (see HeardIndex.update()).
+     Built from log_index if not supplied.
+    :type heard: HeardIndex
+    :param rules: The rules of the contest (the exchanges are compared as in the cross-check)
+    :type rules: ContestRules
+    :return: The participants whose error_info has changed
+    :rtype: set of str
+    """
+    if heard is None:
+        if log_index is None:
+            log_index = LogIndex(participants)
+        heard = HeardIndex(log_index)
+
+    worked = heard.worked
+    changed = set()
+
+    for p in participants:
+        if callsigns is not None and p not in callsigns:
+            continue
+
+        for qso in participants[p].log:
+            if qso.error_code != Qso.ERROR_NOT_IN_LOG and qso.error_code != Qso.ERROR_PARTNER_LOG_MISSING:
+                continue
+
+            error_info = findBustedCall(qso, heard, max_distance, qso_time_difference, rules)
+
+            if not error_info and worked.get(qso.his_call) == 1 and qso.his_call not in participants:
+                for distance, callsign in heard.getUniqueCalls(participants).find(qso.his_call, max_distance):
+                    if callsign != qso.call:
+                        error_info = "Probably busted call " + callsign + " (logged by " + str(worked[callsign]) + \
+                                     " stations)"
+                        break
+
+            if error_info != qso.error_info:
+                qso.error_info = error_info
+                changed.add(p)
+
+    return changed
+
+
+def findBustedCall(qso, heard, max_distance, qso_time_difference, rules=DEFAULT_RULES):
+    """
+    :param qso: QSO that was not found in the log of his_call (or his_call has no log)
+    :type qso: Qso
+    :type heard: HeardIndex
+    :param max_distance: Maximum edit distance between his_call and the proposed callsign
+    :type max_distance: int
+    :param rules: The rules of the contest (the compared exchange)
+    :type rules: ContestRules
+    :return: The proposal for error_info or empty string
+    :rtype: str
+    """
+    is_received = rules.isReceivedCorrectly
+    best = None
+    for q in heard.getQsos(qso.call, qso.minute, qso_time_difference+1):
+        if q.call == qso.his_call:
+            continue  # The QSO was checked against this log already
+
+        received = is_received(qso, q)
+        sent = is_received(q, qso)
+        if not received and not sent:
+            continue  # Just another QSO at about the same time
+
+        distance = editDistance(q.call, qso.his_call, max_distance)
+        if distance > max_distance:
+            continue
+
+        rank = (not (received and sent), distance)
+        if best is None or rank < best[0]:
+            best = (rank, q)
+
+    if best is None:
+        return ""
+    return "Probably busted call " + best[1].call + " - QSO in the log of " + best[1].call + ":\n" + \
+        best[1].toCabrillo()
@@ -0,0 +1,92 @@
+import os
+import pickle
+
+
+class CheckedState:
+    """
+    The result of a log check that is kept between the runs of the program (see --incremental).
+
+    When some of the log files are added or replaced only their participants (and the QSOs of the others made with
+    them) have to be checked again.
+    """
+
+    # Increase when the format of the stored data changes
+    VERSION = 6
+
+    def __init__(self, parameters):
+        """
+        :param parameters: The parameters of the log check (contest time, qso repeat period...). The state can be used
+         only with the same parameters.
+        :type parameters: tuple
+        """
+        self.version = self.VERSION
+        self.parameters = parameters
+
+        self.files = {}  #:type : dict of {filename: (file signature, Participant)}
+        self.log_index = None  #:type : LogIndex
+
+
+    def getParticipants(self, filenames):
+        """
+        Returns the participants of the supplied files. If two files are for the same callsign the later one is used (as
+        in log_parser.parseLogs()).
+
+        :type filenames: list of str
+        :return: Dictonary of particpants. {callsign, participant object}
+        :rtype: dict
+        """
+        participants = {}
+
+        for filename in filenames:
+            participant = self.files[filename][1]
+            if len(participant.callsign):
+                participants[participant.callsign] = participant
+
+        return participants
+
+
+def getFileSignature(filename):
+    """
+    Returns value that changes when the file is modified
+
+    :type filename: str
+    :rtype: tuple
+    """
+    stat = os.stat(filename)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def loadCheckedState(filename, parameters):
+    """
+    Loads the state saved by a previous run
+
+    :param filename: The file with the saved state
+    :type filename: str
+    :param parameters: The parameters of the current log check
+    :type parameters: tuple
+    :return: The state or None if there is no usable state
+    :rtype: CheckedState
+    """
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        with open(filename, "rb") as f:
+            state = pickle.load(f)
+    except Exception:
+        return None
+
+    if not isinstance(state, CheckedState) or state.version != CheckedState.VERSION or state.parameters != parameters:
+        return None
+
+    return state
+
+
+def saveCheckedState(state, filename):
+    """
+    :type state: CheckedState
+    :param filename: Where the state will be saved
+    :type filename: str
+    """
+    with open(filename, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,184 @@
+import numpy as np
+
+from qso import Qso, parseDateTime
+
+
+def _factorize(values, ids):
+    """
+    Replaces each value with an integer id. Equal values get equal ids.
+
+    :param values: list of hashable values
+    :param ids: dictionary {value: id} that is extended with the new values
+    :type ids: dict
+    :rtype: numpy.ndarray
+    """
+    return np.fromiter((ids.setdefault(v, len(ids)) for v in values), dtype=np.int64, count=len(values))
+
+
+class _Columns:
+    """
+    The QSOs of all participants as columns. QSO i is qsos[i] - the QSOs of each log are kept in log order.
+    """
+
+    def __init__(self, participants):
+        self.qsos = []
+        owners = []
+        for p in participants:
+            self.qsos.extend(participants[p].log)
+            owners.extend([p] * len(participants[p].log))
+
+        calls = {}
+        for p in participants:
+            calls.setdefault(p, len(calls))
+        self.participant_count = len(calls)  # ids below this value are callsigns which have sent a log
+
+        self.owner = _factorize(owners, calls)
+        self.call = _factorize([q.call for q in self.qsos], calls)
+        self.his_call = _factorize([q.his_call for q in self.qsos], calls)
+        self.call_count = len(calls)
+
+        modes = {}
+        self.mode = _factorize([q.mode for q in self.qsos], modes)
+        self.mode_count = len(modes)
+
+        self.minute = np.fromiter((q.minute for q in self.qsos), dtype=np.int64, count=len(self.qsos))
+
+        exchange = {}
+        self.snd1 = _factorize([q.snd1 for q in self.qsos], exchange)
+        self.snd2 = _factorize([q.snd2 for q in self.qsos], exchange)
+        self.rcv1 = _factorize([q.rcv1 for q in self.qsos], exchange)
+        self.rcv2 = _factorize([q.rcv2 for q in self.qsos], exchange)
+
+
+def _windowJoin(keys_a, minutes_a, keys_b, minutes_b, low, high):
+    """
+    Finds all pairs (a, b) for which keys_a[a] == keys_b[b] and low <= minutes_b[b] - minutes_a[a] <= high
+
+    :return: Two arrays with the indices of a and b. The pairs of each "a" are consecutive.
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    if len(keys_a) == 0 or len(keys_b) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    first = min(minutes_a.min(), minutes_b.min())
+    span = max(minutes_a.max(), minutes_b.max()) - first + abs(low) + abs(high) + 1
+    composite_a = keys_a * span + (minutes_a - first)
+    composite_b = keys_b * span + (minutes_b - first)
+
+    order_b = np.argsort(composite_b, kind="stable")
+    sorted_b = composite_b[order_b]
+    lo = np.searchsorted(sorted_b, composite_a + low, side="left")
+    hi = np.searchsorted(sorted_b, composite_a + high, side="right")
+
+    counts = np.maximum(hi - lo, 0)
+    total = counts.sum()
+    pair_a = np.repeat(np.arange(len(keys_a)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_b = order_b[np.repeat(lo, counts) + offsets]
+
+    return pair_a, pair_b
+
+
+def checkLog(participants, start_date_time, end_date_time, qso_repeat_period=30, qso_time_difference=3):
+    """
+    This will check the validity of each QSO of every participant. Alternative to logchecker_lzhfqrp.checkLog() for
+    very large contests that writes the same error codes (and error_info) into the QSOs.
+
+    All QSOs are loaded into numpy arrays (one array per column) and the date window, the cross-check and most of the
+    "30min rule" are done with vectorised operations.
+
+    :param start_date_time: contest start time
+    :param end_date_time: contest end time
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param qso_repeat_period: period after which the QSO with the same station is allowed
+    :type qso_repeat_period: int
+    :param participants:
+    :type participants: dict of Participant
+    :return: none
+    """
+    columns = _Columns(participants)
+    count = len(columns.qsos)
+
+    error_code = np.zeros(count, dtype=np.int64)
+    error_info = np.full(count, -1, dtype=np.int64)  # index of the QSO that is written into error_info
+
+    # Date window
+    # -----------------------------------------
+    rejected = (columns.minute < parseDateTime(start_date_time)) | (columns.minute > parseDateTime(end_date_time))
+    error_code[rejected] = Qso.ERROR_DATE_TIME
+
+    # Missing logs
+    # -----------------------------------------
+    has_log = columns.his_call < columns.participant_count
+    error_code[~rejected & ~has_log] = Qso.ERROR_PARTNER_LOG_MISSING
+    checked = np.flatnonzero(~rejected & has_log)
+
+    # Cross-check - the QSO of A is searched in the log of B (his_call) for QSOs made with A (call)
+    # -----------------------------------------
+    cross_code = np.full(count, Qso.ERROR_NOT_IN_LOG, dtype=np.int64)
+    cross_info = np.full(count, -1, dtype=np.int64)
+
+    pair_a, pair_b = _windowJoin(columns.his_call[checked] * columns.call_count + columns.call[checked],
+                                 columns.minute[checked],
+                                 columns.owner * columns.call_count + columns.his_call,
+                                 columns.minute,
+                                 -qso_time_difference, qso_time_difference)
+    pair_a = checked[pair_a]
+
+    partner_receive = (columns.snd1[pair_a] != columns.rcv1[pair_b]) | (columns.snd2[pair_a] != columns.rcv2[pair_b])
+    receive = (columns.snd1[pair_b] != columns.rcv1[pair_a]) | (columns.snd2[pair_b] != columns.rcv2[pair_a])
+    pair_code = np.where(partner_receive, Qso.ERROR_PARTNER_RECEIVE, np.where(receive, Qso.ERROR_RECEIVE, Qso.NO_ERROR))
+    matching = pair_code == Qso.NO_ERROR
+
+    # The QSOs of B are visited in log order: the first matching one makes the QSO valid, otherwise the last
+    # non-matching one is reported
+    first_match = np.full(count, count, dtype=np.int64)
+    np.minimum.at(first_match, pair_a[matching], pair_b[matching])
+    visited = pair_b < first_match[pair_a]
+    last_visited = np.full(count, -1, dtype=np.int64)
+    np.maximum.at(last_visited, pair_a[visited], pair_b[visited])
+
+    has_match = first_match < count
+    cross_code[has_match] = Qso.NO_ERROR
+    mismatched = ~has_match & (last_visited >= 0)
+    cross_code[mismatched] = np.where(
+        (columns.snd1[mismatched] != columns.rcv1[last_visited[mismatched]]) |
+        (columns.snd2[mismatched] != columns.rcv2[last_visited[mismatched]]),
+        Qso.ERROR_PARTNER_RECEIVE, Qso.ERROR_RECEIVE)
+    cross_info[last_visited >= 0] = last_visited[last_visited >= 0]
+
+    # "30min rule" - a QSO can be a dupe only if there is a cross-checked QSO with the same station and mode within the
+    # repeat period. Only the groups (owner, his_call, mode) where this happens are resolved QSO by QSO.
+    # -----------------------------------------
+    group = (columns.owner * columns.call_count + columns.his_call) * columns.mode_count + columns.mode
+    confirmed = checked[cross_code[checked] == Qso.NO_ERROR]
+
+    pair_a, pair_b = _windowJoin(group[checked], columns.minute[checked], group[confirmed], columns.minute[confirmed],
+                                 -(qso_repeat_period - 1), qso_repeat_period - 1)
+    pair_a = checked[pair_a]
+    pair_b = confirmed[pair_b]
+    conflicting_groups = set(group[pair_a[pair_a != pair_b]].tolist())
+
+    error_code[checked] = cross_code[checked]
+    error_info[checked] = cross_info[checked]
+
+    if conflicting_groups:
+        in_conflict = checked[np.isin(group[checked], np.fromiter(conflicting_groups, dtype=np.int64))]
+        valid_in_group = {}  # group: list of valid QSO indices in log order
+        for i in in_conflict.tolist():
+            valid = valid_in_group.setdefault(group[i], [])
+            dupe = next((v for v in valid if abs(columns.minute[v] - columns.minute[i]) < qso_repeat_period), None)
+            if dupe is not None:
+                error_code[i] = Qso.ERROR_DUPE
+                error_info[i] = dupe
+            elif cross_code[i] == Qso.NO_ERROR:
+                valid.append(i)
+
+    # Write the result into the QSOs
+    # -----------------------------------------
+    qsos = columns.qsos
+    for i, (code, info) in enumerate(zip(error_code.tolist(), error_info.tolist())):
+        qsos[i].error_code = code
+        if info >= 0:
+            qsos[i].error_info = qsos[info].toCabrillo()
@@ -0,0 +1,304 @@
+import configparser
+from operator import attrgetter
+
+from contest_statistics import BANDS, getBand
+from qso import Qso
+
+BAND_NAMES = {band for band, _, _ in BANDS}
+
+# Keys of a rule profile (see parseRules()). "repeat.<mode or band>" and "points.<mode or band>" are allowed too.
+RULE_KEYS = ("dupe_per_band", "exchange", "ignore_case", "points", "multiplier", "multiplier_field")
+
+
+def _fold(value):
+    return value.upper() if type(value) is str else value
+
+
+def _compileExchangeCheck(fields, ignore_case):
+    """
+    Generates the exchange comparison for the compared fields, e.g. for both fields:
+
+    def isReceivedCorrectly(receiver, sender):
+        return receiver.rcv1 == sender.snd1 and receiver.rcv2 == sender.snd2
+
+    and isExchangeMatching(qso1, qso2) with the same result as cross_check.isExchangeMatching(). The check of a
+    QSO runs only the comparisons of its contest.
+
+    :param fields: The compared exchange fields (1 and/or 2)
+    :type fields: tuple of int
+    :param ignore_case: Compare the text exchanges case-insensitively
+    :type ignore_case: bool
+    :return: isReceivedCorrectly, isExchangeMatching
+    :rtype: (callable, callable)
+    """
+    value = "_fold({}.{}{})" if ignore_case else "{}.{}{}"
+
+    def received(receiver, sender):
+        return " and ".join(value.format(receiver, "rcv", f) + " == " + value.format(sender, "snd", f) for f in fields)
+
+    source = "\n".join([
+        "def isReceivedCorrectly(receiver, sender):",
+        "    return " + received("receiver", "sender"),
+        "",
+        "def isExchangeMatching(qso1, qso2):",
+        "    if not (" + received("qso2", "qso1") + "):",
+        "        qso1.error_code = ERROR_PARTNER_RECEIVE",
+        "        qso1.error_info = qso2.toCabrillo()  # store the QSO from the other log for the Error report",
+        "        return False",
+        "    if not (" + received("qso1", "qso2") + "):",
+        "        qso1.error_code = ERROR_RECEIVE",
+        "        qso1.error_info = qso2.toCabrillo()",
+        "        return False",
+        "    return True",
+        "",
+    ])
+
+    namespace = {"_fold": _fold, "ERROR_PARTNER_RECEIVE": Qso.ERROR_PARTNER_RECEIVE,
+                 "ERROR_RECEIVE": Qso.ERROR_RECEIVE}
+    exec(compile(source, "<contest rules>", "exec"), namespace)
+    return namespace["isReceivedCorrectly"], namespace["isExchangeMatching"]
+
+
+class ContestRules:
+    """
+    The rules of a contest: the "30min rule", the compared exchange, the points and the multipliers. ContestRules()
+    are the rules of the LZ contests checked so far (see DEFAULT_RULES).
+
+    The rules are compiled once into functions specialised for them (compile()), so checking and scoring a QSO doesn't
+    go through the branches of all the possible rules.
+    """
+
+    def __init__(self, repeat_periods=None, dupe_per_band=False, exchange=(1, 2), ignore_case=False, points=2,
+                 points_by=None, multiplier="EP", multiplier_field=2):
+        """
+        :param repeat_periods: The repeat period (in minutes) of the QSOs in some modes or bands, e.g. {"PH": 20,
+         "80m": 15}. The modes are as in Qso.mode (PH for SSB). The band is used before the mode. The other QSOs use
+         --qso_repeat.
+        :type repeat_periods: dict of {str: int}
+        :param dupe_per_band: Separate "30min rule" for each band (there is always separate one for each mode)
+        :type dupe_per_band: bool
+        :param exchange: The exchange fields compared by the cross-check (1 and/or 2)
+        :type exchange: tuple of int
+        :param ignore_case: Compare the text exchanges case-insensitively (the numbers are always compared as numbers)
+        :type ignore_case: bool
+        :param points: Points for each valid QSO
+        :type points: int
+        :param points_by: The points of the QSOs in some modes or bands, e.g. {"CW": 3}. The band is used before the
+         mode.
+        :type points_by: dict of {str: int}
+        :param multiplier: Each station that sends this exchange (e.g. "EP") is a multiplier once worked (empty - no
+         multipliers)
+        :type multiplier: str
+        :param multiplier_field: The exchange field with the multiplier (1 or 2)
+        :type multiplier_field: int
+        """
+        self.repeat_periods = {_normaliseKey(key): int(value) for key, value in (repeat_periods or {}).items()}
+        self.dupe_per_band = bool(dupe_per_band)
+        self.exchange = tuple(sorted(set(int(field) for field in exchange)))
+        self.ignore_case = bool(ignore_case)
+        self.points = int(points)
+        self.points_by = {_normaliseKey(key): int(value) for key, value in (points_by or {}).items()}
+        self.multiplier = multiplier.upper()
+        self.multiplier_field = int(multiplier_field)
+
+        if not self.exchange or not set(self.exchange) <= {1, 2}:
+            raise ValueError("Incorrect exchange fields (should be 1 and/or 2): " + str(exchange))
+        if self.multiplier_field not in (1, 2):
+            raise ValueError("Incorrect multiplier field (should be 1 or 2): " + str(multiplier_field))
+
+        self.compile()
+
+
+    def compile(self):
+        """
+        Creates the functions used by the log check and the scoring
+        """
+        self.isReceivedCorrectly, self.isExchangeMatching = _compileExchangeCheck(self.exchange, self.ignore_case)
+
+        # Group of the "30min rule" - None is (his_call, mode), built inline by DupeChecker
+        self.getDupeKey = (lambda qso: (qso.his_call, qso.mode, getBand(qso.freq))) if self.dupe_per_band else None
+
+        sent = attrgetter("snd" + str(self.multiplier_field))
+        received = "rcv" + str(self.multiplier_field)
+        self.getSentMultiplier = lambda qso: str(sent(qso)).upper()
+        self.multiplier_key = (received, self.multiplier)  # see ScoreLedger.worked_text_exchanges
+
+
+    def getRepeatPeriod(self, qso_repeat_period):
+        """
+        :param qso_repeat_period: The repeat period of the QSOs without a rule
+        :type qso_repeat_period: int
+        :return: Function returning the repeat period of a QSO or None if all the QSOs use qso_repeat_period
+        :rtype: callable
+        """
+        if not self.repeat_periods:
+            return None
+
+        bands = {band for band in self.repeat_periods if band in BAND_NAMES}
+        periods = self.repeat_periods
+
+        def getPeriod(qso):
+            if bands:
+                band = getBand(qso.freq)
+                if band in periods:
+                    return periods[band]
+            return periods.get(qso.mode, qso_repeat_period)
+
+        return getPeriod
+
+
+    def getQsoPoints(self, mode, freq):
+        """
+        :return: Points of a valid QSO
+        :rtype: int
+        """
+        if self.points_by:
+            band = getBand(freq)
+            if band in self.points_by:
+                return self.points_by[band]
+            return self.points_by.get(mode, self.points)
+        return self.points
+
+
+    def getPoints(self, ledger):
+        """
+        :param ledger: The score ledger of a participant
+        :type ledger: ScoreLedger
+        :return: Points of the participant
+        :rtype: int
+        """
+        if not self.points_by:
+            return ledger.valid_count * self.points
+        return sum(count * self.getQsoPoints(mode, freq) for (mode, freq), count in ledger.valid_by_mode_freq.items())
+
+
+    def getMultipliers(self, ledger):
+        """
+        :param ledger: The score ledger of a participant
+        :type ledger: ScoreLedger
+        :return: Number of the worked multiplier stations
+        :rtype: int
+        """
+        if not self.multiplier:
+            return 0
+        return len(ledger.worked_text_exchanges.get(self.multiplier_key, ()))
+
+
+    def isMultiplierStation(self, participant):
+        """
+        :type participant: Participant
+        :return: If the participant sends the multiplier exchange (decided by the first QSO of the log as in the
+         official BFRA software)
+        :rtype: bool
+        """
+        for q in participant.log:
+            return bool(self.multiplier) and self.getSentMultiplier(q) == self.multiplier
+
+
+    def getProfile(self):
+        """
+        :return: The rules as a tuple (compared to find out if two rule sets are the same)
+        :rtype: tuple
+        """
+        return (tuple(sorted(self.repeat_periods.items())), self.dupe_per_band, self.exchange, self.ignore_case,
+                self.points, tuple(sorted(self.points_by.items())), self.multiplier, self.multiplier_field)
+
+
+    def __eq__(self, other):
+        return isinstance(other, ContestRules) and self.getProfile() == other.getProfile()
+
+
+    def __hash__(self):
+        return hash(self.getProfile())
+
+
+    def __reduce__(self):
+        # The compiled functions can't be pickled - they are created again (e.g. in the worker processes)
+        return ContestRules, (self.repeat_periods, self.dupe_per_band, self.exchange, self.ignore_case, self.points,
+                              self.points_by, self.multiplier, self.multiplier_field)
+
+
+DEFAULT_RULES = ContestRules()
+
+
+def _normaliseKey(key):
+    """
+    :param key: Mode (e.g. "CW") or band (e.g. "80m")
+    :type key: str
+    :rtype: str
+    """
+    return key.lower() if key.lower() in BAND_NAMES else key.upper()
+
+
+def _toBool(value):
+    return configparser.ConfigParser.BOOLEAN_STATES[value.lower()]
+
+
+def parseRules(values):
+    """
+    Creates the rules from the keys of a config file section. All keys are optional:
+
+    repeat.PH = 20          ; repeat period of the SSB (PH) QSOs (the others use --qso_repeat), also: repeat.80m
+    dupe_per_band = yes     ; separate "30min rule" for each band
+    exchange = 1 2          ; the compared exchange fields
+    ignore_case = yes       ; compare the text exchanges case-insensitively
+    points = 2              ; points for each valid QSO
+    points.CW = 3           ; points of the CW QSOs, also for bands: points.40m
+    multiplier = EP         ; each worked station sending EP is a multiplier (empty - no multipliers)
+    multiplier_field = 2    ; the exchange field with the multiplier
+
+    :param values: The keys and values (the other keys are ignored)
+    :type values: dict of {str: str}
+    :rtype: ContestRules
+    """
+    repeat_periods = {}
+    points_by = {}
+    for key, value in values.items():
+        if key.startswith("repeat."):
+            repeat_periods[key[len("repeat."):]] = value
+        elif key.startswith("points."):
+            points_by[key[len("points."):]] = value
+
+    try:
+        return ContestRules(repeat_periods, _toBool(values.get("dupe_per_band", "no")),
+                            values.get("exchange", "1 2").replace(",", " ").split(),
+                            _toBool(values.get("ignore_case", "no")), values.get("points", 2), points_by,
+                            values.get("multiplier", "EP"), values.get("multiplier_field", 2))
+    except KeyError as e:
+        raise ValueError("Incorrect value: " + str(e))
+
+
+def checkRuleKeys(values, source, other_keys=()):
+    """
+    Rejects the misspelled keys - parseRules() ignores the keys it doesn't know
+
+    :param values: The keys and values of a config file section
+    :type values: dict of {str: str}
+    :param source: The file or section with the keys (for the error message)
+    :type source: str
+    :param other_keys: The keys which aren't rules but are allowed in the section
+    :type other_keys: tuple of str
+    """
+    unknown = [key for key in values if key not in RULE_KEYS and key not in other_keys
+               and not key.startswith("repeat.") and not key.startswith("points.")]
+    if unknown:
+        raise ValueError("Unknown keys in " + source + ": " + ", ".join(unknown))
+
+
+def loadRules(filename):
+    """
+    Reads the rules from the [rules] section of a config file (see parseRules() and rules_example.ini)
+
+    :param filename: Path to the config file
+    :type filename: str
+    :rtype: ContestRules
+    """
+    config = configparser.ConfigParser(interpolation=None)
+    if not config.read(filename, encoding="utf-8"):
+        raise ValueError("Can't read the rules file: " + filename)
+    if not config.has_section("rules"):
+        raise ValueError("No [rules] section in: " + filename)
+
+    values = dict(config["rules"])
+    checkRuleKeys(values, filename)
+    return parseRules(values)
@@ -0,0 +1,204 @@
+import csv
+import json
+import os
+
+from qso import Qso, parseDateTime
+
+
+# Band edges in kHz (Qso.freq is in kHz in the cabrillo logs)
+BANDS = [
+    ("160m", 1800, 2000),
+    ("80m", 3500, 4000),
+    ("60m", 5060, 5450),
+    ("40m", 7000, 7300),
+    ("30m", 10100, 10150),
+    ("20m", 14000, 14350),
+    ("17m", 18068, 18168),
+    ("15m", 21000, 21450),
+    ("12m", 24890, 24990),
+    ("10m", 28000, 29700),
+    ("6m", 50000, 54000),
+    ("2m", 144000, 148000),
+]
+
+
+def getBand(freq):
+    """
+    :param freq: Frequency in kHz (see Qso.freq)
+    :type freq: int
+    :return: Name of the band (e.g. "80m") or "unknown"
+    :rtype: str
+    """
+    for band, low, high in BANDS:
+        if low <= freq <= high:
+            return band
+    return "unknown"
+
+
+class ContestStatistics:
+    """
+    Statistics of the whole contest collected in a single pass over the checked QSOs (see add()).
+
+    The QSO rate is counted into fixed-size time bins from the contest start, everything else into counters.
+    """
+
+    def __init__(self, start_date_time, end_date_time, bin_minutes=1):
+        """
+        :param start_date_time: contest start time
+        :param end_date_time: contest end time
+        :param bin_minutes: Size of the time bins of the QSO rate in minutes
+        :type bin_minutes: int
+        """
+        self.start = parseDateTime(start_date_time)
+        self.end = parseDateTime(end_date_time)
+        self.bin_minutes = bin_minutes
+        self.bin_count = (self.end - self.start) // bin_minutes + 1
+
+        self.rate = {}  #:type : dict of {callsign: list of QSOs in each time bin}
+        self.total_rate = [0] * self.bin_count
+        self.band_mode = {}  #:type : dict of {(band, mode): [QSOs, valid QSOs]}
+        self.errors = {}  #:type : dict of {error code: QSOs}
+        self.missing_logs = {}  #:type : dict of {his_call: [QSOs, set of the stations that logged it]}
+        self.qsos = 0
+        self.valid_qsos = 0
+
+
+    def add(self, participant):
+        """
+        Adds the checked QSOs of a participant
+
+        :type participant: Participant
+        """
+        start, end, bin_minutes = self.start, self.end, self.bin_minutes
+        rate = self.rate.setdefault(participant.callsign, [0] * self.bin_count)
+        total_rate = self.total_rate
+        band_mode = self.band_mode
+        errors = self.errors
+        bands = {}  # freq: band - the same frequencies repeat in the log
+
+        for qso in participant.log:
+            error_code = qso.error_code
+
+            if start <= qso.minute <= end:
+                time_bin = (qso.minute - start) // bin_minutes
+                rate[time_bin] += 1
+                total_rate[time_bin] += 1
+
+            band = bands.get(qso.freq)
+            if band is None:
+                band = bands[qso.freq] = getBand(qso.freq)
+            counts = band_mode.get((band, qso.mode))
+            if counts is None:
+                counts = band_mode[(band, qso.mode)] = [0, 0]
+            counts[0] += 1
+
+            if error_code == Qso.NO_ERROR:
+                counts[1] += 1
+                self.valid_qsos += 1
+            elif error_code == Qso.ERROR_PARTNER_LOG_MISSING:
+                missing = self.missing_logs.get(qso.his_call)
+                if missing is None:
+                    missing = self.missing_logs[qso.his_call] = [0, set()]
+                missing[0] += 1
+                missing[1].add(participant.callsign)
+
+            errors[error_code] = errors.get(error_code, 0) + 1
+
+        self.qsos += len(participant.log)
+
+
+    def getMostWorkedMissingLogs(self, count=50):
+        """
+        :param count: Maximum number of returned callsigns
+        :type count: int
+        :return: The callsigns without log that were logged most often: (callsign, QSOs, stations that logged it)
+        :rtype: list of (str, int, int)
+        """
+        missing = [(his_call, qsos, len(stations)) for his_call, (qsos, stations) in self.missing_logs.items()]
+        missing.sort(key=lambda entry: (-entry[2], -entry[1], entry[0]))
+        return missing[:count]
+
+
+    def getBinStart(self, time_bin):
+        """
+        :return: Start of the time bin ("yyyy-mm-dd hhmm")
+        :rtype: str
+        """
+        return (Qso.EPOCH + (self.start + time_bin * self.bin_minutes) * Qso.ONE_MINUTE).strftime(Qso.DATE_TIME_FORMAT)
+
+
+    def toDict(self):
+        """
+        :rtype: dict
+        """
+        return {
+            "qsos": self.qsos,
+            "valid_qsos": self.valid_qsos,
+            "participants": len(self.rate),
+            "bin_minutes": self.bin_minutes,
+            "bins": [self.getBinStart(time_bin) for time_bin in range(self.bin_count)],
+            "total_rate": self.total_rate,
+            "rate": {callsign: self.rate[callsign] for callsign in sorted(self.rate)},
+            "bands": [{"band": band, "mode": mode, "qsos": counts[0], "valid_qsos": counts[1]}
+                      for (band, mode), counts in sorted(self.band_mode.items())],
+            "errors": {Qso.ERROR_NAMES.get(code, str(code)): count for code, count in sorted(self.errors.items())},
+            "missing_logs": [{"callsign": callsign, "qsos": qsos, "stations": stations}
+                             for callsign, qsos, stations in self.getMostWorkedMissingLogs()],
+        }
+
+
+    def write(self, to_dir):
+        """
+        Writes statistics.json and the CSV files (statistics_rate.csv, statistics_bands.csv, statistics_errors.csv and
+        statistics_missing_logs.csv)
+
+        :param to_dir: Directory where results must be written
+        :type to_dir: str
+        """
+        with open(os.path.join(to_dir, "statistics.json"), "w", encoding="utf-8") as f:
+            json.dump(self.toDict(), f, indent=1)
+
+        with open(os.path.join(to_dir, "statistics_rate.csv"), "w", encoding="utf-8") as output:
+            writer = csv.writer(output, lineterminator='\n')
+            writer.writerow(["callsign"] + [self.getBinStart(time_bin) for time_bin in range(self.bin_count)])
+            writer.writerow(["TOTAL"] + self.total_rate)
+            for callsign in sorted(self.rate):
+                writer.writerow([callsign] + self.rate[callsign])
+
+        with open(os.path.join(to_dir, "statistics_bands.csv"), "w", encoding="utf-8") as output:
+            writer = csv.writer(output, lineterminator='\n')
+            writer.writerow(["band", "mode", "qsos", "valid_qsos"])
+            for (band, mode), counts in sorted(self.band_mode.items()):
+                writer.writerow([band, mode] + counts)
+
+        with open(os.path.join(to_dir, "statistics_errors.csv"), "w", encoding="utf-8") as output:
+            writer = csv.writer(output, lineterminator='\n')
+            writer.writerow(["error", "qsos"])
+            for code, count in sorted(self.errors.items()):
+                writer.writerow([Qso.ERROR_NAMES.get(code, str(code)), count])
+
+        with open(os.path.join(to_dir, "statistics_missing_logs.csv"), "w", encoding="utf-8") as output:
+            writer = csv.writer(output, lineterminator='\n')
+            writer.writerow(["callsign", "qsos", "stations"])
+            writer.writerows(self.getMostWorkedMissingLogs())
+
+
+def writeStatistics(participants, to_dir, start_date_time, end_date_time, bin_minutes=1):
+    """
+    Collects the statistics of the checked logs and writes them next to results.csv
+
+    :param participants:
+    :type participants: dict of Participant
+    :param to_dir: Directory where results must be written
+    :type to_dir: str
+    :param start_date_time: contest start time
+    :param end_date_time: contest end time
+    :param bin_minutes: Size of the time bins of the QSO rate in minutes
+    :type bin_minutes: int
+    :rtype: ContestStatistics
+    """
+    statistics = ContestStatistics(start_date_time, end_date_time, bin_minutes)
+    for p in participants:
+        statistics.add(participants[p])
+    statistics.write(to_dir)
+    return statistics
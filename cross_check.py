@@ -0,0 +1,156 @@
+from qso import Qso
+from contest_rules import DEFAULT_RULES
+from metrics import metrics
+
+
+def isIntervalSmallerThan(qso1, qso2, time_delta):
+    """
+    Checks if the time interval between the two QSOs is less then delta
+
+    :type qso1: Qso
+    :type qso2: Qsolist
+    :param time_delta: Time interval in miutes
+    :type time_delta: int
+    :rtype: bool
+    """
+
+    if abs(qso1.minute - qso2.minute) < time_delta:
+        return True
+    else:
+        return False
+
+
+def isDupe(qso, participant, qso_repeat_period, dupe_checker=None):
+    """
+    Checks if the QSO did not meet the "30min rule"
+
+    :param qso: Qso that is to be checked
+    :type qso: Qso
+    :param participant: The participant
+    :type participant: Participant
+    :param qso_repeat_period: The allowed period after which a Qso can be made again
+    :type qso_repeat_period: int
+    :param dupe_checker: If supplied the valid QSOs registered in it are used instead of rescanning the log
+    :type dupe_checker: DupeChecker
+    :rtype: bool
+    """
+    if dupe_checker is not None:
+        q = dupe_checker.findDupe(qso)
+        if q is None:
+            return False
+        qso.error_code = Qso.ERROR_DUPE  # Violating the "30min rule"
+        qso.error_info = q.toCabrillo()
+        return True
+
+    idx = participant.log.index(qso)
+
+    for q in participant.log[0:idx]:
+        if q.isValid() \
+                and qso.his_call == q.his_call \
+                and isIntervalSmallerThan(qso, q, qso_repeat_period) \
+                and qso.mode == q.mode:  # There is separate 30min rule for each mode.
+            qso.error_code = Qso.ERROR_DUPE # Violating the "30min rule"
+            qso.error_info = q.toCabrillo()
+            return True
+
+    return False
+
+
+def isExchangeMatching(qso1, qso2):
+    """
+    Check if the serials from the two qso match (the rules of the LZ contests, see ContestRules.isExchangeMatching for
+    the other contests)
+
+    :type qso1: Qso
+    :type qso2: Qso
+    :return: True if the two Qso entries match
+    :rtype: bool
+    """
+    if qso1.snd1 != qso2.rcv1 or qso1.snd2 != qso2.rcv2:
+        qso1.error_code = Qso.ERROR_PARTNER_RECEIVE
+        qso1.error_info = qso2.toCabrillo()  # store the QSO from the other log for the Error report
+
+        return False
+    if qso2.snd1 != qso1.rcv1 or qso2.snd2 != qso1.rcv2:
+        qso1.error_code = Qso.ERROR_RECEIVE
+        qso1.error_info = qso2.toCabrillo()  # store the QSO from the other log for the Error report
+        return False
+
+    return True
+
+
+def doCrossCheck(qso, participant_a, participant_b, qso_time_difference, log_index=None, rules=DEFAULT_RULES):
+    """
+    Check if the qso of participantA is available in the log of participantB
+    :param qso_time_difference: cross-check allowed difference for a QSO in the two logs [in minutes]
+    :type qso_time_difference: int
+    :param qso: qso from the log of participantA that we would like to check with the participantB log
+    :type qso: Qso
+    :param participant_a: Log of participantA which. The supplied "qso" is part of the participantA log
+    :param participant_b: Where we will checking if the qso is valid
+    :param log_index: If supplied only the QSOs within the time window are taken from the index (instead of scanning
+     the whole log of participantB)
+    :type log_index: LogIndex
+    :param rules: The rules of the contest (the compared exchange)
+    :type rules: ContestRules
+    :return: True if the qso was found inside the log of participantB
+    :rtype: bool
+    """
+    assert(qso.his_call == participant_b.callsign)
+
+    if log_index is not None:
+        candidates = log_index.getCandidates(participant_b.callsign, qso.call, qso.minute, qso_time_difference+1)
+    else:
+        candidates = participant_b.log
+
+    is_exchange_matching = rules.isExchangeMatching
+    scanned = same_call = mismatches = 0  # The work done, for the metrics
+
+    for q in candidates:
+        scanned += 1
+        if qso.call == q.his_call:
+            same_call += 1
+            if isIntervalSmallerThan(qso, q, qso_time_difference+1):
+
+                # The rule below makes sense but it is not implemented in the official BFRA software.
+                # ------------------
+                # QSO that we have found in correspondents log is marked as invalid
+                # if q.isInvalid():
+                #     # Store the reason for being invalid
+                #     qso.error_code = q.translatePartnerError()
+                #     qso.error_info = q.toCabrillo()
+                #     return True
+                # ------------------
+
+                if not is_exchange_matching(qso, q):
+                    mismatches += 1
+                    continue # We found a QSO with a wrong exchange - but we will continue to search for a valid one
+                else:
+                    qso.error_code = Qso.NO_ERROR # Valid contact was found
+                    if metrics.enabled:
+                        _countCrossCheck(scanned, same_call, mismatches)
+                    return True
+
+    if metrics.enabled:
+        _countCrossCheck(scanned, same_call, mismatches)
+
+    if qso.error_code == Qso.NO_ERROR:
+        qso.error_code = Qso.ERROR_NOT_IN_LOG  # We didn't find any QSO with participantA in the log the participantB
+    return False
+
+
+def _countCrossCheck(scanned, same_call, mismatches):
+    """
+    Updates the metrics with the work done by doCrossCheck(). The work is counted by the scan itself - nothing is
+    searched again, so the cross_check stage measures only the check.
+
+    :param scanned: Number of the searched candidates
+    :type scanned: int
+    :param same_call: Number of the candidates made with the call of the QSO (their time was compared)
+    :type same_call: int
+    :param mismatches: Number of the candidates within the time window with a wrong exchange
+    :type mismatches: int
+    """
+    metrics.count("crosscheck_candidates_scanned", scanned)
+    metrics.count("is_interval_smaller_than_calls", same_call)
+    metrics.count("exchange_mismatches", mismatches)
@@ -0,0 +1,61 @@
+from bisect import bisect_left, bisect_right, insort
+
+from contest_rules import DEFAULT_RULES
+
+
+class DupeChecker:
+    """
+    Keeps track of the valid QSOs of a single log so that the "30min rule" can be checked in one pass over the log.
+
+    The valid QSOs are grouped by (his_call, mode) - there is a separate repeat period for each mode (and band if the
+    contest rules say so) - and every group is kept sorted by QSO time. Checking a QSO looks only at the QSOs of its
+    group that are within the repeat period.
+    """
+
+    def __init__(self, qso_repeat_period, rules=DEFAULT_RULES):
+        """
+        :param qso_repeat_period: The allowed period (in minutes) after which a Qso can be made again
+        :type qso_repeat_period: int
+        :param rules: The rules of the contest (the repeat period of some modes or bands, separate groups for the bands)
+        :type rules: ContestRules
+        """
+        self.qso_repeat_period = qso_repeat_period
+        self.getRepeatPeriod = rules.getRepeatPeriod(qso_repeat_period)  # None - the same period for all QSOs
+        self.getKey = rules.getDupeKey  # None - (his_call, mode)
+        self.valid_qsos = {}  #:type : dict of {(his_call, mode): list of (Qso.minute, position, Qso)}
+
+
+    def findDupe(self, qso):
+        """
+        Returns the earliest (in log order) valid QSO that has been made with the same station and in the same mode
+        less than qso_repeat_period minutes from the supplied QSO.
+
+        :param qso: Qso that is to be checked
+        :type qso: Qso
+        :return: The conflicting QSO or None
+        :rtype: Qso
+        """
+        group = self.valid_qsos.get((qso.his_call, qso.mode) if self.getKey is None else self.getKey(qso))
+        if not group:
+            return None
+
+        period = self.qso_repeat_period if self.getRepeatPeriod is None else self.getRepeatPeriod(qso)
+        lo = bisect_right(group, (qso.minute - period, float("inf")))
+        hi = bisect_left(group, (qso.minute + period, -1))
+        if lo >= hi:
+            return None
+
+        return min(group[lo:hi], key=lambda entry: entry[1])[2]
+
+
+    def addValid(self, qso, position):
+        """
+        Registers a QSO that has passed the log checking
+
+        :param qso: Valid Qso
+        :type qso: Qso
+        :param position: Position of the QSO inside the log
+        :type position: int
+        """
+        insort(self.valid_qsos.setdefault((qso.his_call, qso.mode) if self.getKey is None else self.getKey(qso), []),
+               (qso.minute, position, qso))
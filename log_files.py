@@ -0,0 +1,160 @@
+import glob
+import os
+
+from checked_state import getFileSignature
+
+
+# Separates the path of the zip file from the name of the member. Example: "C:\LZFD2017.zip::LOGS-LZFD2017/LZ0AA.log"
+ZIP_MEMBER_SEPARATOR = "::"
+
+
+def isZipMember(name):
+    """
+    :param name: Name of a log file (see findLogFiles())
+    :type name: str
+    :rtype: bool
+    """
+    return ZIP_MEMBER_SEPARATOR in name
+
+
+def isLogMember(info):
+    """
+    :type info: zipfile.ZipInfo
+    :return: True if the member of the zip file can be a log (the same files as "*.*" in a directory)
+    :rtype: bool
+    """
+    basename = info.filename.rsplit("/", 1)[-1]
+    return not info.is_dir() and "." in basename and not info.filename.startswith("__MACOSX/")
+
+
+def isZipFile(filename):
+    """
+    :type filename: str
+    :rtype: bool
+    """
+    return filename.lower().endswith(".zip")
+
+
+# The zip files opened by openZipFile(): {path: (signature, process id, zipfile.ZipFile)}, the last used at the end
+_zip_files = {}
+MAX_OPEN_ZIP_FILES = 8
+
+
+def openZipFile(path):
+    """
+    The zip files are kept open while their members are read - reading the directory of a zip file for each member
+    would be slow. The file is opened again when its signature changes. The process id is checked because forked worker
+    processes must not share the file position of the parent. The files must be closed with closeZipFiles() when the
+    reading is done, so no file stays open (e.g. between the passes of --watch).
+
+    :param path: Path to the zip file
+    :type path: str
+    :rtype: zipfile.ZipFile
+    """
+    import zipfile  # Slow to import - only when there are zip files
+
+    signature = getFileSignature(path)
+    pid = os.getpid()
+
+    entry = _zip_files.pop(path, None)
+    if entry is not None and entry[:2] != (signature, pid):
+        entry[2].close()
+        entry = None
+    if entry is None:
+        entry = (signature, pid, zipfile.ZipFile(path))
+    _zip_files[path] = entry
+
+    while len(_zip_files) > MAX_OPEN_ZIP_FILES:
+        oldest = next(iter(_zip_files))
+        _zip_files.pop(oldest)[2].close()
+
+    return entry[2]
+
+
+def closeZipFiles():
+    """
+    Closes the zip files opened by openZipFile()
+    """
+    while _zip_files:
+        _, (_, _, zip_file) = _zip_files.popitem()
+        zip_file.close()
+
+
+def findLogFiles(path):
+    """
+    Finds the log files in a directory, in a zip file or in the zip files inside a directory. The members of the zip
+    files are read without extracting them (see readLogFile()).
+
+    :param path: Directory or zip file with the cabrillo logs
+    :type path: str
+    :return: The names of the log files and their signatures (a signature changes when the file is modified). The
+     members of the zip files are named <zip file>::<member>.
+    :rtype: dict of {name: signature}
+    """
+    if os.path.isdir(path):
+        filenames = glob.glob(os.path.join(path, "*.*"))
+    else:
+        filenames = [path]
+
+    signatures = {}
+
+    try:
+        for filename in filenames:
+            try:
+                if isZipFile(filename):
+                    signatures.update(findZipMembers(filename))
+                else:
+                    signatures[filename] = getFileSignature(filename)
+            except OSError:
+                pass  # Removed in the meantime
+    finally:
+        closeZipFiles()
+
+    return signatures
+
+
+def findZipMembers(path):
+    """
+    :param path: Path to the zip file
+    :type path: str
+    :return: The names of the logs in the zip file and their signatures (see findLogFiles())
+    :rtype: dict of {name: signature}
+    """
+    import zipfile
+
+    try:
+        infos = openZipFile(path).infolist()
+    except zipfile.BadZipFile:
+        return {}  # Still being copied
+
+    return {path + ZIP_MEMBER_SEPARATOR + info.filename: (info.file_size, info.CRC) for info in infos
+            if isLogMember(info)}
+
+
+def readLogFile(name):
+    """
+    :param name: Name of a log file (see findLogFiles())
+    :type name: str
+    :return: Contents of the file
+    :rtype: bytes
+    """
+    # The zip file stays open for the next members (see openZipFile())
+    if isZipMember(name):
+        path, member = name.split(ZIP_MEMBER_SEPARATOR, 1)
+        return openZipFile(path).read(member)
+
+    with open(name, "rb") as f:
+        return f.read()
+
+
+def getResultsDir(path):
+    """
+    :param path: Directory or zip file with the cabrillo logs
+    :type path: str
+    :return: Where the results are written - inside the directory or next to the zip file (<zip name>_results, so the
+     zip files of several contests can be kept in the same directory)
+    :rtype: str
+    """
+    if os.path.isdir(path):
+        return os.path.join(path, "results")
+    return os.path.splitext(os.path.abspath(path))[0] + "_results"
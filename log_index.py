@@ -0,0 +1,98 @@
+from bisect import bisect_left, bisect_right
+
+
+class LogIndex:
+    """
+    Lookup structure used during cross-checking.
+
+    For every participant the log is split by the worked station (his_call) and each part is sorted by QSO time. This
+    way the cross-check looks only at the QSOs that are within the allowed time window instead of scanning the whole
+    log of the correspondent.
+    """
+
+    def __init__(self, participants):
+        """
+        :param participants: Dictionary of participants {callsign, participant object}
+        :type participants: dict of Participant
+        """
+
+        self.index = {}  #:type : dict of {callsign: {his_call: (list of Qso.minute, list of (position, Qso))}}
+
+        for p in participants:
+            self.update(participants[p])
+
+
+    def update(self, participant):
+        """
+        Adds the log of the participant to the index (replaces the old one if the participant is already indexed)
+
+        :type participant: Participant
+        """
+        by_his_call = {}
+        for position, qso in enumerate(participant.log):
+            by_his_call.setdefault(qso.his_call, []).append((qso.minute, position, qso))
+
+        entries = {}
+        for his_call, qsos in by_his_call.items():
+            qsos.sort(key=lambda entry: (entry[0], entry[1]))
+            entries[his_call] = ([entry[0] for entry in qsos], [(entry[1], entry[2]) for entry in qsos])
+
+        self.index[participant.callsign] = entries
+
+
+    def remove(self, callsign):
+        """
+        Removes the log of the participant from the index
+
+        :type callsign: str
+        """
+        self.index.pop(callsign, None)
+
+
+    def getQsos(self, callsign, his_calls):
+        """
+        Returns the QSOs from the log of "callsign" made with any of the supplied stations. Only the parts of the log
+        made with these stations are visited, not the whole log.
+
+        :param callsign: The owner of the log
+        :type callsign: str
+        :param his_calls: The worked stations
+        :type his_calls: set of str
+        :return: (position in the log, Qso) in log order
+        :rtype: list of (int, Qso)
+        """
+        entries = self.index.get(callsign, {})
+        qsos = []
+        for his_call in his_calls:
+            part = entries.get(his_call)
+            if part is not None:
+                qsos.extend(part[1])
+
+        qsos.sort(key=lambda entry: entry[0])
+        return qsos
+
+
+    def getCandidates(self, callsign, his_call, minute, time_delta):
+        """
+        Returns the QSOs from the log of "callsign" made with "his_call" for which the time interval to "minute" is
+        less than time_delta. The QSOs are returned in the order in which they appear in the log.
+
+        :param callsign: The owner of the log that is searched
+        :type callsign: str
+        :param his_call: The worked station
+        :type his_call: str
+        :param minute: QSO time (see Qso.minute)
+        :type minute: int
+        :param time_delta: Time interval in minutes
+        :type time_delta: int
+        :rtype: list of Qso
+        """
+        entries = self.index.get(callsign, {}).get(his_call)
+        if entries is None:
+            return []
+
+        times, qsos = entries
+        lo = bisect_right(times, minute - time_delta)
+        hi = bisect_left(times, minute + time_delta)
+
+        return [qso for position, qso in sorted(qsos[lo:hi], key=lambda entry: entry[0])]
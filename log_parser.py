@@ -0,0 +1,167 @@
+import functools
+import io
+import logging
+
+import my_utils
+import parse_cache
+from log_files import findLogFiles, readLogFile, closeZipFiles
+from metrics import metrics
+from participant import Participant
+from qso import Qso
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+
+def parseLogFile(filename, cache_dir=None):
+    """
+    Parses a single cabrillo file.
+
+    The messages are not logged directly but returned to the caller. This way the file can be parsed in a worker
+    process and the messages are still reported in a deterministic order.
+
+    :param filename: Path to the log file or member of a zip file (see log_files.findLogFiles())
+    :type filename: str
+    :param cache_dir: If supplied the parsed log is taken from (or stored into) the cache in this directory
+    :type cache_dir: str
+    :return: The parsed participant and list of (logging level, message) tuples
+    :rtype: (Participant, list)
+    """
+    raw = readLogFile(filename)
+
+    if cache_dir is None:
+        return parseLog(filename, raw)
+
+    key = parse_cache.getCacheKey(filename, raw)
+    parsed_log = parse_cache.loadParsedLog(cache_dir, key)
+    if parsed_log is None:
+        parsed_log = parseLog(filename, raw)
+        parse_cache.storeParsedLog(cache_dir, key, parsed_log)
+
+    return parsed_log
+
+
+def parseLog(filename, raw):
+    """
+    Parses the contents of a cabrillo file (see parseLogFile())
+
+    :param filename: Path to the log file (used only in the messages)
+    :type filename: str
+    :param raw: Contents of the file
+    :type raw: bytes
+    :return: The parsed participant and list of (logging level, message) tuples
+    :rtype: (Participant, list)
+    """
+    participant = Participant()
+
+    text, participant.encoding, has_errors = my_utils.decodeBytes(raw)
+
+    messages = [(logging.INFO, "parsing log: " + filename + " (encoding: " + participant.encoding + ")")]
+    if has_errors:
+        messages.append((logging.WARNING, "Characters that are not valid " + participant.encoding +
+                         " were replaced in file: " + filename))
+
+    try:
+        for line in io.StringIO(text):
+            line_split = line.split()
+            try:
+                if len(line_split) == 0:
+                    pass
+                elif line_split[0] == "CALLSIGN:":
+                    participant.callsign = line_split[1].upper()
+                elif line_split[0] == "NAME:":
+                    participant.name = " ".join(line_split[1:])
+                elif line_split[0] == "CATEGORY:":
+                    participant.category = " ".join(line_split[1:])
+                elif line_split[0] == "QSO:":
+                    participant.addQso(Qso(line_split))
+            except:
+                messages.append((logging.WARNING, "Error in line (will be ignored): " + line))
+                pass # empty line
+    except Exception as e:
+        messages.append((logging.WARNING, "Error in file (will be ignored): " + filename))
+        messages.append((logging.WARNING, "Error: " + str(e)))
+        pass
+
+    return participant, messages
+
+
+def parseLogFiles(filenames, jobs=1, cache_dir=None):
+    """
+    Parses the supplied cabrillo files
+
+    :param filenames: Paths to the log files
+    :type filenames: list of str
+    :param jobs: Number of worker processes used for parsing the files
+    :type jobs: int
+    :param cache_dir: Directory of the parsed-log cache. No cache is used if None.
+    :type cache_dir: str
+    :return: The parsed participants in the order of the files. Participant.callsign is empty if the file couldn't be
+     parsed.
+    :rtype: list of Participant
+    """
+    parse = functools.partial(parseLogFile, cache_dir=cache_dir)
+
+    if jobs > 1 and len(filenames) > 1:
+        from concurrent.futures import ProcessPoolExecutor  # multiprocessing is slow to import - only when needed
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # map() returns the results in the order of the files - the merge below does not depend on the workers
+            parsed_logs = list(executor.map(parse, filenames, chunksize=max(1, len(filenames) // (jobs * 4))))
+    else:
+        parsed_logs = map(parse, filenames)
+
+    try:
+        return collectParsedLogs(filenames, parsed_logs)
+    finally:
+        closeZipFiles()  # Opened by readLogFile()
+
+
+def collectParsedLogs(filenames, parsed_logs):
+    """
+    Logs the parsing messages of the files
+
+    :param filenames: Paths to the log files
+    :type filenames: list of str
+    :param parsed_logs: The results of parseLogFile() in the order of the files
+    :type parsed_logs: iterable of (Participant, list)
+    :return: The parsed participants in the order of the files
+    :rtype: list of Participant
+    """
+    participants = []
+
+    for filename, (participant, messages) in zip(filenames, parsed_logs):
+
+        for level, message in messages:
+            logger.log(level, message)
+
+        metrics.countBy("files_per_encoding", participant.encoding)
+
+        if len(participant.callsign):
+            logger.info("Parsed log for: " + participant.callsign + "\n")
+        else:
+            logger.error("Couldn't parse the file: " + filename + "\n")
+
+        participants.append(participant)
+
+    return participants
+
+
+def parseLogs(logs_dir, jobs=1, cache_dir=None):
+    """
+    Reads all the logs in the supplied directory and parses the data into dictionary that is returned
+
+    :param logs_dir: Directory where the log files are located (or zip file with the logs)
+    :param jobs: Number of worker processes used for parsing the files
+    :type jobs: int
+    :param cache_dir: Directory of the parsed-log cache. No cache is used if None.
+    :type cache_dir: str
+    :return: Dictonary of particpants. {callsign, participant object}
+    :rtype: dict
+    """
+    participants = {}
+
+    for participant in parseLogFiles(list(findLogFiles(logs_dir)), jobs, cache_dir):
+        if len(participant.callsign):
+            participants[participant.callsign] = participant
+
+    return participants
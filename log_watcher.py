@@ -0,0 +1,133 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import sys
+import time
+
+from log_files import findLogFiles
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) events that can mean a new, changed or removed log
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+
+class LogWatcher:
+    """
+    Waits until the log files in a directory are added, changed or removed (see --watch).
+
+    On Linux the directory is watched with inotify, elsewhere (or if inotify is not available) it is polled. In both
+    cases the files are compared by their signatures (see log_files.findLogFiles()), so the events only wake up the
+    watcher earlier.
+    """
+
+    def __init__(self, log_directory, poll_interval=2.0, settle_time=1.0):
+        """
+        :param log_directory: Directory with the cabrillo logs (or zip file with the logs)
+        :type log_directory: str
+        :param poll_interval: How often (in seconds) the directory is checked when there are no inotify events
+        :type poll_interval: float
+        :param settle_time: The files must not change for this time (in seconds) before waitForChanges() returns - the
+         logs may still be written (or copied) when the first event arrives
+        :type settle_time: float
+        """
+        self.log_directory = log_directory
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.snapshot = self.takeSnapshot()
+        self.inotify_fd = self._initInotify()
+
+
+    def _initInotify(self):
+        """
+        :return: inotify file descriptor or None if inotify is not available
+        :rtype: int
+        """
+        if not sys.platform.startswith("linux"):
+            return None
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+            directory = self.log_directory if os.path.isdir(self.log_directory) else os.path.dirname(
+                os.path.abspath(self.log_directory))
+            if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        except (OSError, AttributeError) as e:
+            logger.info("inotify is not available (" + str(e) + "), the logs directory will be polled")
+            return None
+
+        return fd
+
+
+    def takeSnapshot(self):
+        """
+        :return: The signatures of the log files (the same files as in logchecker_lzhfqrp.updateResults())
+        :rtype: dict of {filename: signature}
+        """
+        return findLogFiles(self.log_directory)
+
+
+    def _wait(self, timeout):
+        """
+        Waits for inotify events (or just sleeps when polling)
+
+        :param timeout: In seconds
+        :type timeout: float
+        """
+        if self.inotify_fd is None:
+            time.sleep(timeout)
+            return
+
+        readable, _, _ = select.select([self.inotify_fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self.inotify_fd, 64 * 1024):
+                    pass  # The events themselves are not needed - the snapshot tells what has changed
+            except BlockingIOError:
+                pass
+
+
+    def waitForChanges(self):
+        """
+        Blocks until some of the log files are added, changed or removed and the files stop changing (see
+        settle_time).
+
+        :return: The new signatures of the log files
+        :rtype: dict of {filename: signature}
+        """
+        while True:
+            self._wait(self.poll_interval)
+            snapshot = self.takeSnapshot()
+            if snapshot != self.snapshot:
+                break
+
+        # Wait until the files are completely written
+        while True:
+            time.sleep(self.settle_time)
+            settled_snapshot = self.takeSnapshot()
+            if settled_snapshot == snapshot:
+                break
+            snapshot = settled_snapshot
+
+        self.snapshot = snapshot
+        return snapshot
+
+
+    def close(self):
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
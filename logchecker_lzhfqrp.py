@@ -1,335 +1,314 @@
-import csv
-
-from participant import Participant
-from qso import Qso
-import glob
+from qso import Qso, parseDateTime
+from log_index import LogIndex
+from dupe_checker import DupeChecker
+from checked_state import CheckedState, loadCheckedState, saveCheckedState
+from metrics import metrics
+from log_files import findLogFiles, getResultsDir
+# The parsing is used through this module by batch_check.py and submission_server.py too
+from log_parser import parseLogFile, parseLog, parseLogFiles, collectParsedLogs, parseLogs
+from cross_check import isDupe, doCrossCheck
+from results_writer import removeUbnReport, writeResults, writeResultsElectronProgress
+from busted_calls import suggestBustedCalls
+from pair_matching import checkLogPairs
+from contest_rules import DEFAULT_RULES, loadRules
+from contest_statistics import writeStatistics
 from datetime import datetime
 import os
 import logging
-import logging.config
-import my_utils
+import parse_cache
 import argparse
 import re
 import sys
 
-logging.config.fileConfig("logging.conf", disable_existing_loggers=False)
 logger = logging.getLogger(__name__)
 logger.setLevel(level=logging.INFO)
 
 
-def parseLogs(logs_dir):
-    """
-    Reads all the logs in the supplied directory and parses the data into dictionary that is returned
-
-    :param logs_dir: Directory where the log files are located
-    :return: Dictonary of particpants. {callsign, participant object}
-    :rtype: dict
-    """
-    participants = {}
-
-    for filename in glob.glob(os.path.join(logs_dir, "*.*")):
-
-        participant = Participant()
+def rejectQsoOutdsideTheContest(participants, start_date_time, end_date_time):
 
-        logger.info("parsing log: " + filename)
-        logfile = open(filename, "r", encoding=my_utils.getFileEncoding(filename))
+    start = parseDateTime(start_date_time)
+    end = parseDateTime(end_date_time)
 
+    for p in participants:
+        for qso in participants[p].log:
+            if qso.minute < start or qso.minute > end:
+                qso.error_code = Qso.ERROR_DATE_TIME
 
-        try:
-            for line in logfile:
-                line_split = line.split()
-                try:
-                    if len(line_split) == 0:
-                        pass
-                    elif line_split[0] == "CALLSIGN:":
-                        participant.callsign = line_split[1].upper()
-                    elif line_split[0] == "NAME:":
-                        participant.name = " ".join(line_split[1:])
-                    elif line_split[0] == "CATEGORY:":
-                        participant.category = " ".join(line_split[1:])
-                    elif line_split[0] == "QSO:":
-                        participant.log.append(Qso(line_split))
-                except:
-                    logger.warning("Error in line (will be ignored): " + line)
-                    pass # empty line
-        except Exception as e:
-            logger.warning("Error in file (will be ignored): " + filename)
-            logger.warning("Error: " + str(e))
-            pass
 
-        if len(participant.callsign):
-            participants[participant.callsign] = participant
-            logger.info("Parsed log for: " + participant.callsign + "\n")
-        else:
-            logger.error("Couldn't parse the file: " + filename + "\n")
+def checkLog(participants, start_date_time, end_date_time, qso_repeat_period=30, qso_time_difference=3, log_index=None,
+             jobs=1, pair_matching=False, rules=DEFAULT_RULES):
+    """
+    This will check the validity of each QSO of every participant
+    :param start_date_time: contest start time
+    :param end_date_time: contest end time
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param qso_repeat_period: period after which the QSO with the same station is allowed
+    :type qso_repeat_period: int
+    :param participants:
+    :type participants: dict of Participant
+    :param log_index: Cross-check index of the logs. Built from the participants if not supplied.
+    :type log_index: LogIndex
+    :param jobs: Number of worker processes used for checking the logs
+    :type jobs: int
+    :param pair_matching: Match both sides of each contact once (see pair_matching.py) instead of cross-checking each
+     log separately. The pairs are checked in this process.
+    :type pair_matching: bool
+    :param rules: The rules of the contest
+    :type rules: ContestRules
+    :return: none
+    """
+    if log_index is None:
+        log_index = LogIndex(participants)
 
-    return participants
+    with metrics.stage("date_rejection"):
+        rejectQsoOutdsideTheContest(participants, start_date_time, end_date_time)
 
+    if pair_matching:
+        with metrics.stage("pair_matching"):
+            metrics.count("pair_links", checkLogPairs(participants, qso_repeat_period, qso_time_difference, log_index,
+                                                      rules=rules))
+        return
 
-def rejectQsoOutdsideTheContest(participants, start_date_time, end_date_time):
+    if jobs > 1 and len(participants) > 1:
+        checkParticipantsInParallel(participants, qso_repeat_period, qso_time_difference, log_index, jobs, rules)
+        return
 
     for p in participants:
-        print(participants[p].callsign)
-        if not participants[p].log:
-            continue
-        date_format = participants[p].log[0].DATE_TIME_FORMAT # Date format used by the Qso class
+        checkParticipant(participants, p, qso_repeat_period, qso_time_difference, log_index, rules=rules)
 
-        start = datetime.strptime(start_date_time, date_format)
-        end = datetime.strptime(end_date_time, date_format)
 
-        log = participants[p].log
+# The data used by the worker processes of checkContestsInParallel()
+_worker_check_data = None
 
-        for qso in log:
-            if qso.date_time.timestamp() < start.timestamp() or qso.date_time.timestamp() > end.timestamp():
-                qso.error_code = Qso.ERROR_DATE_TIME
+
+def _initCheckWorker(contests, metrics_enabled):
+    global _worker_check_data
+    _worker_check_data = contests
+    metrics.reset(metrics_enabled)
 
 
-def isIntervalSmallerThan(qso1, qso2, time_delta):
+def _checkPartition(partition):
     """
-    Checks if the time interval between the two QSOs is less then delta
+    Checks the logs of the supplied participants inside a worker process
 
-    :type qso1: Qso
-    :type qso2: Qsolist
-    :param time_delta: Time interval in miutes
-    :type time_delta: int
-    :rtype: bool
+    :param partition: Index of the contest (see checkContestsInParallel()) and the callsigns of the participants
+    :type partition: (int, list of str)
+    :return: list of (error_code, error_info) for each QSO of each participant and the metrics of the partition (see
+     Metrics.toDict())
+    :rtype: (list of list, dict)
     """
+    contest, callsigns = partition
+    participants, qso_repeat_period, qso_time_difference, log_index, rules = _worker_check_data[contest]
+    metrics.reset(metrics.enabled)
 
-    if qso1.date_time.timestamp() > qso2.date_time.timestamp():
-        diff = qso1.date_time - qso2.date_time
-    else:
-        diff = qso2.date_time - qso1.date_time
+    results = []
+    for p in callsigns:
+        checkParticipant(participants, p, qso_repeat_period, qso_time_difference, log_index, rules=rules)
+        results.append([(qso.error_code, qso.error_info) for qso in participants[p].log])
 
-    if diff.total_seconds() / 60 < time_delta:
-        return True
-    else:
-        return False
+    return results, metrics.toDict()
 
 
-def isDupe(qso, participant, qso_repeat_period):
+def checkParticipantsInParallel(participants, qso_repeat_period, qso_time_difference, log_index, jobs,
+                                rules=DEFAULT_RULES):
     """
-    Checks if the QSO did not meet the "30min rule"
+    Checks the logs of all participants in worker processes (the QSOs outside the contest must already be rejected).
 
-    :param qso: Qso that is to be checked
-    :type qso: Qso
-    :param participant: The participant
-    :type participant: Participant
-    :param qso_repeat_period: The allowed period after which a Qso can be made again
+    :param participants:
+    :type participants: dict of Participant
+    :param qso_repeat_period: period after which the QSO with the same station is allowed
     :type qso_repeat_period: int
-    :rtype: bool
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param log_index: Cross-check index of the logs
+    :type log_index: LogIndex
+    :param jobs: Number of worker processes
+    :type jobs: int
+    :param rules: The rules of the contest
+    :type rules: ContestRules
+    :return: none
     """
-    idx = participant.log.index(qso)
-
-    for q in participant.log[0:idx]:
-        if q.isValid() \
-                and qso.his_call == q.his_call \
-                and isIntervalSmallerThan(qso, q, qso_repeat_period) \
-                and qso.mode == q.mode:  # There is separate 30min rule for each mode.
-            qso.error_code = Qso.ERROR_DUPE # Violating the "30min rule"
-            qso.error_info = q.toCabrillo()
-            return True
+    checkContestsInParallel([(participants, qso_repeat_period, qso_time_difference, log_index, rules)], jobs)
 
-    return False
 
-
-def isExchangeMatching(qso1, qso2):
+def checkContestsInParallel(contests, jobs):
     """
-    Check if the serials from the two qso match
+    Checks the logs of all participants of one or more contests in one pool of worker processes (the QSOs outside the
+    contests must already be rejected).
 
-    :type qso1: Qso
-    :type qso2: Qso
-    :return: True if the two Qso entries match
-    :rtype: bool
-    """
-    if qso1.snd1 != qso2.rcv1 or qso1.snd2 != qso2.rcv2:
-        qso1.error_code = Qso.ERROR_PARTNER_RECEIVE
-        qso1.error_info = qso2.toCabrillo()  # store the QSO from the other log for the Error report
+    The check of a log changes only the QSOs of that log, so the participants are split between the workers. Each worker
+    gets the logs once (copy-on-write where the processes are forked) and returns only the error codes and error_info.
+    The result does not depend on the number of workers.
 
-        return False
-    if qso2.snd1 != qso1.rcv1 or qso2.snd2 != qso1.rcv2:
-        qso1.error_code = Qso.ERROR_RECEIVE
-        qso1.error_info = qso2.toCabrillo()  # store the QSO from the other log for the Error report
-        return False
-
-    return True
-
-
-def doCrossCheck(qso, participant_a, participant_b, qso_time_difference):
+    :param contests: (participants, qso repeat period, cross-check time difference, log index, rules) of each contest
+    :type contests: list of (dict of Participant, int, int, LogIndex, ContestRules)
+    :param jobs: Number of worker processes
+    :type jobs: int
+    :return: none
     """
-    Check if the qso of participantA is available in the log of participantB
-    :param qso_time_difference: cross-check allowed difference for a QSO in the two logs [in minutes]
-    :type qso_time_difference: int
-    :param qso: qso from the log of participantA that we would like to check with the participantB log
-    :type qso: Qso
-    :param participant_a: Log of participantA which. The supplied "qso" is part of the participantA log
-    :param participant_b: Where we will checking if the qso is valid
-    :return: True if the qso was found inside the log of participantB
-    :rtype: bool
+    # Split the participants into partitions with similar number of QSOs - several partitions per worker so that
+    # the workers finish at about the same time
+    partitions = []
+    for contest, (participants, _, _, _, _) in enumerate(contests):
+        partition_count = jobs * 4
+        callsigns = [[] for _ in range(partition_count)]
+        sizes = [0] * partition_count
+        for p in sorted(participants, key=lambda p: len(participants[p].log), reverse=True):
+            smallest = sizes.index(min(sizes))
+            callsigns[smallest].append(p)
+            sizes[smallest] += len(participants[p].log) + 1
+        partitions.extend((size, contest, partition) for size, partition in zip(sizes, callsigns) if partition)
+
+    # The biggest partitions of all contests first - the small ones fill the gaps at the end
+    partitions.sort(key=lambda partition: partition[0], reverse=True)
+    partitions = [(contest, partition) for _, contest, partition in partitions]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_initCheckWorker,
+                             initargs=(contests, metrics.enabled)) as executor:
+        for (contest, partition), (results, worker_metrics) in zip(partitions,
+                                                                    executor.map(_checkPartition, partitions)):
+            metrics.merge(worker_metrics)
+            participants = contests[contest][0]
+            for p, qso_results in zip(partition, results):
+                for qso, (error_code, error_info) in zip(participants[p].log, qso_results):
+                    qso.error_code = error_code
+                    qso.error_info = error_info
+
+
+def checkParticipant(participants, callsign, qso_repeat_period, qso_time_difference, log_index, his_calls=None,
+                     rules=DEFAULT_RULES):
     """
-    assert(qso.his_call == participant_b.callsign)
-
-    for q in participant_b.log:
-        if qso.call == q.his_call and isIntervalSmallerThan(qso, q, qso_time_difference+1):
-
-            # The rule below makes sense but it is not implemented in the official BFRA software.
-            # ------------------
-            # QSO that we have found in correspondents log is marked as invalid
-            # if q.isInvalid():
-            #     # Store the reason for being invalid
-            #     qso.error_code = q.translatePartnerError()
-            #     qso.error_info = q.toCabrillo()
-            #     return True
-            # ------------------
-
-            if not isExchangeMatching(qso, q):
-                continue # We found a QSO with a wrong exchange - but we will continue to search for a valid one
-            else:
-                qso.error_code = Qso.NO_ERROR # Valid contact was found
-                return True
-
-    if qso.error_code == Qso.NO_ERROR:
-        qso.error_code = Qso.ERROR_NOT_IN_LOG  # We didn't find any QSO with participantA in the log the participantB
-    return False
-
+    Checks the QSOs of a single participant (the QSOs outside the contest must already be rejected)
 
-def checkLog(participants, start_date_time, end_date_time, qso_repeat_period=30, qso_time_difference=3):
-    """
-    This will check the validity of each QSO of every participant
-    :param start_date_time: contest start time
-    :param end_date_time: contest end time
-    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
-    :type qso_time_difference: int
-    :param qso_repeat_period: period after which the QSO with the same station is allowed
-    :type qso_repeat_period: int
     :param participants:
     :type participants: dict of Participant
+    :param callsign: The participant whose log is checked
+    :type callsign: str
+    :param qso_repeat_period: period after which the QSO with the same station is allowed
+    :type qso_repeat_period: int
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param log_index: Cross-check index of the logs
+    :type log_index: LogIndex
+    :param his_calls: If supplied only the QSOs made with these stations are checked
+    :type his_calls: set of str
+    :param rules: The rules of the contest
+    :type rules: ContestRules
     :return: none
     """
-    rejectQsoOutdsideTheContest(participants, start_date_time, end_date_time)
+    participant = participants[callsign]
+    dupe_checker = DupeChecker(qso_repeat_period, rules)
+
+    is_dupe, cross_check = isDupe, doCrossCheck
+    if metrics.enabled:
+        is_dupe, cross_check = metrics.timed("dupes", isDupe), metrics.timed("cross_check", doCrossCheck)
+
+    if his_calls is None:
+        qsos = enumerate(participant.log)
+    elif log_index is not None:
+        # The "30min rule" is separate for each station - the other QSOs don't matter
+        qsos = log_index.getQsos(callsign, his_calls)
+    else:
+        qsos = [(position, qso) for position, qso in enumerate(participant.log) if qso.his_call in his_calls]
 
-    for p in participants:
-        for qso in participants[p].log:
+    for position, qso in qsos:
 
-            if qso.isInvalid():
-                continue # Stops verification in case the Qso has been rejected
+        if qso.isInvalid():
+            continue # Stops verification in case the Qso has been rejected
 
-            elif qso.his_call not in participants:
-                qso.error_code = Qso.ERROR_PARTNER_LOG_MISSING # Missing log for this corresponded  - move to next Qso
+        elif qso.his_call not in participants:
+            qso.error_code = Qso.ERROR_PARTNER_LOG_MISSING # Missing log for this corresponded  - move to next Qso
 
-            elif isDupe(qso, participants[p], qso_repeat_period):
-                pass
+        elif is_dupe(qso, participant, qso_repeat_period, dupe_checker):
+            pass
 
-            else:
-                doCrossCheck(qso, participants[p], participants[qso.his_call], qso_time_difference)
+        elif cross_check(qso, participant, participants[qso.his_call], qso_time_difference, log_index, rules):
+            dupe_checker.addValid(qso, position)  # Only valid QSOs count for the "30min rule"
 
 
-def writeResults(participants, to_dir):
+def recheckLogs(participants, callsigns, start_date_time, end_date_time, qso_repeat_period, qso_time_difference,
+                log_index, pair_matching=False, rules=DEFAULT_RULES):
     """
-    Writes the results in the supplied dir (this includes stuff like general results, UBN and maybe more)
+    Checks again the logs of the supplied participants and the QSOs from all the other logs that were made with them.
+    Used when some of the logs have been added or replaced after the logs were checked.
 
-    :param ep: If this is an Electron Progress contests (then we have to calculate also multipliers)
-    :type ep: bool
     :param participants:
-    :type participants: list of Participants
-    :param to_dir: Directory where results must be written
-    :rtype: str
-    :return:
+    :type participants: dict of Participant
+    :param callsigns: The participants whose logs have been changed (including added and removed ones)
+    :type callsigns: set of str
+    :param start_date_time: contest start time
+    :param end_date_time: contest end time
+    :param qso_repeat_period: period after which the QSO with the same station is allowed
+    :type qso_repeat_period: int
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param log_index: Cross-check index of the logs (already updated with the changed logs)
+    :type log_index: LogIndex
+    :param pair_matching: Match both sides of each contact once (see pair_matching.py)
+    :type pair_matching: bool
+    :param rules: The rules of the contest
+    :type rules: ContestRules
+    :return: The participants with at least one QSO that has been checked again
+    :rtype: set of str
     """
+    start = parseDateTime(start_date_time)
+    end = parseDateTime(end_date_time)
 
-    # Create the classification - results.csv
-    # -----------------------------------------
-    list_classification = []
+    rechecked = set()
 
     for p in participants:
-        list_classification.append(participants[p].getResults())
-
-    list_classification = sorted(list_classification,
-                                 key=lambda list_classification: (list_classification[3], list_classification[4]),
-                                 reverse=True)  # Sort by points
-
-    # Add the rank
-    for idx, entry in enumerate(list_classification):
-        entry.insert(0, idx+1)
-
-    # Print the results into a CSV file called results.csv
-    filename = os.path.join(to_dir, "results.csv")
-    with open(filename, "w+", encoding="utf-8") as output:
-        writer = csv.writer(output, lineterminator='\n')
-        writer.writerows(list_classification)
+        if p in callsigns:
+            his_calls = None
+            qsos = participants[p].log
+        else:
+            # Only the QSOs made with the changed logs - found through the index instead of scanning the whole log
+            his_calls = callsigns
+            qsos = [qso for _, qso in log_index.getQsos(p, callsigns)]
+            if not qsos:
+                continue
+
+        rechecked.add(p)
+        for qso in qsos:
+            qso.error_code = Qso.NO_ERROR
+            qso.error_info = ""
+            qso.partner = None
+            if qso.minute < start or qso.minute > end:
+                qso.error_code = Qso.ERROR_DATE_TIME
 
-    # Write the UBN reports
-    # -----------------------------------------
-    ubn_dir = os.path.join(to_dir, "UBN")
-    if not os.path.exists(ubn_dir):
-        os.makedirs(ubn_dir) # Create UBN directory if not existing
+        if not pair_matching:
+            checkParticipant(participants, p, qso_repeat_period, qso_time_difference, log_index, his_calls, rules)
 
-    for p in participants:
-        filename = os.path.join(ubn_dir, participants[p].callsign.replace("/", "_") + ".UBN")
-        ubn_file = open(filename, "w+", encoding="utf-8")
-        ubn_file.write(participants[p].getUbnReport())
-        ubn_file.close()
+    if pair_matching:
+        # Each pair is checked for both logs - only the pairs with a changed log
+        checkLogPairs(participants, qso_repeat_period, qso_time_difference, log_index, callsigns, rules)
 
+    return rechecked
 
-def writeResultsElectronProgress(participants, to_dir):
-    """
-    Writes the results in the supplied dir (this includes stuff like general results, UBN and maybe more)
 
-    :param participants:
-    :type participants: list of Participants
-    :param to_dir: Directory where results must be written
-    :rtype: str
-    :return:
+def setupLogging(config_filename="logging.conf"):
     """
+    Configures the logging of the program. Not done on import, so the modules can be used as a library.
 
-    # Create the classification - results.csv
-    # -------------------------
-    list_classification_A = []
-    list_classification_B = []
-
+    The config file is searched in the current dir and next to the program (or the pyinstaller executable). If it is not
+    found the messages are written to stdout (the same as the supplied logging.conf).
 
-    for p in participants:
-        if participants[p].isElectronProgressStation():
-            list_classification_A.append(participants[p].getResultsEP())
-        else:
-            list_classification_B.append(participants[p].getResultsEP())
-
-        list_classification_A = sorted(list_classification_A,
-                                       key=lambda list_classification_A: (list_classification_A[5], list_classification_A[6]),
-                                       reverse=True)  # Sort by score and then by Accuracy
-
-        list_classification_B = sorted(list_classification_B,
-                                       key=lambda list_classification_B: (
-                                       list_classification_B[5], list_classification_B[6]),
-                                       reverse=True)  # Sort by score and then by Accuracy
-
-    # Add the rank
-    for idx, entry in enumerate(list_classification_A):
-        entry.insert(0, idx+1)
-    for idx, entry in enumerate(list_classification_B):
-        entry.insert(0, idx+1)
-
-    # Print the results into a CSV file called results.csv
-    filename = os.path.join(to_dir, "results_A.csv")
-    with open(filename, "w+", encoding="utf-8") as output:
-        writer = csv.writer(output, lineterminator='\n')
-        writer.writerows(list_classification_A)
-
-    filename = os.path.join(to_dir, "results_B.csv")
-    with open(filename, "w+", encoding="utf-8") as output:
-        writer = csv.writer(output, lineterminator='\n')
-        writer.writerows(list_classification_B)
-
-    # Write the UBN reports
-    # -------------------------
-    ubn_dir = os.path.join(to_dir, "UBN")
-    if not os.path.exists(ubn_dir):
-        os.makedirs(ubn_dir)  # Create UBN directory if not existing
+    :param config_filename: Name of the logging config file
+    :type config_filename: str
+    """
+    program = sys.executable if getattr(sys, "frozen", False) else sys.argv[0]
+    for directory in (os.getcwd(), os.path.dirname(os.path.abspath(program))):
+        filename = os.path.join(directory, config_filename)
+        if os.path.exists(filename):
+            import logging.config
+            logging.config.fileConfig(filename, disable_existing_loggers=False)
+            return
 
-    for p in participants:
-        filename = os.path.join(ubn_dir, participants[p].callsign.replace("/", "_") + ".UBN")
-        ubn_file = open(filename, "w+", encoding="utf-8")
-        ubn_file.write(participants[p].getUbnReport())
-        ubn_file.close()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.ERROR)
 
 
 def is_valid_date_time_format(date_time_string):
@@ -349,14 +328,127 @@ def is_valid_date_time_format(date_time_string):
         return False
 
 
-def main(start_date, end_date, log_directory, qso_repeat_period_in_mins=30, qso_time_difference_in_mins=3, ep=0):
+def updateResults(state, log_directory, results_dir, cache_dir, jobs=1, engine="python", ep=False, ubn_archive=False,
+                  state_filename=None, sqlite_filename=None):
+    """
+    Parses the logs that have changed since the state was updated, checks them and writes the results. The logs are
+    checked from scratch if the state has no index yet.
+
+    :param state: The checked logs. Updated with the changes. state.parameters is (start date, end date, qso repeat
+     period, cross-check time difference, propose busted calls, pair matching, contest rules).
+    :type state: CheckedState
+    :param log_directory: Directory with the cabrillo logs (or zip file with the logs)
+    :type log_directory: str
+    :param results_dir: Where the results are written
+    :type results_dir: str
+    :param cache_dir: Directory of the parsed-log cache. No cache is used if None.
+    :type cache_dir: str
+    :param jobs: Number of worker processes used for parsing and checking the logs
+    :type jobs: int
+    :param engine: "python" or "numpy"
+    :type engine: str
+    :param ep: If this is an "ElctronProgress" contest
+    :type ep: bool
+    :param ubn_archive: Write the UBN reports into a single zip file (results/UBN.zip)
+    :type ubn_archive: bool
+    :param state_filename: If supplied the state is saved into this file (see --incremental)
+    :type state_filename: str
+    :param sqlite_filename: If supplied all the participants and QSOs are written into this SQLite database
+    :type sqlite_filename: str
+    :return: Dictonary of particpants. {callsign, participant object}
+    :rtype: dict
+    """
+    start_date, end_date, qso_repeat_period, qso_time_difference, suggest_calls, pair_matching, rules = state.parameters
+
+    signatures = findLogFiles(log_directory)
+    filenames = list(signatures)
+
+    changed = [f for f in filenames if f not in state.files or state.files[f][0] != signatures[f]]
+    removed = [f for f in state.files if f not in signatures]
+    changed_callsigns = {state.files[f][1].callsign for f in changed + removed if f in state.files}
+
+    with metrics.stage("parse"):
+        parsed_participants = parseLogFiles(changed, jobs, cache_dir)
+    for filename, participant in zip(changed, parsed_participants):
+        state.files[filename] = (signatures[filename], participant)
+        changed_callsigns.add(participant.callsign)
+    for filename in removed:
+        del state.files[filename]
+    changed_callsigns.discard("")
+
+    participants = state.getParticipants(filenames)
+
+    # Check the logs
+    if state.log_index is None:
+        if engine == "numpy":
+            import columnar_check  # numpy is needed only by this engine
+            with metrics.stage("check"):
+                columnar_check.checkLog(participants, start_date, end_date, qso_repeat_period, qso_time_difference)
+            if state_filename is not None:
+                with metrics.stage("index"):
+                    state.log_index = LogIndex(participants)
+        else:
+            # Index the logs for cross-checking
+            with metrics.stage("index"):
+                state.log_index = LogIndex(participants)
+
+            with metrics.stage("check"):
+                checkLog(participants, start_date, end_date, qso_repeat_period, qso_time_difference,
+                         state.log_index, jobs, pair_matching, rules)
+        ubn_callsigns = None
+    else:
+        logger.info("Checking again the logs of: " + ", ".join(sorted(changed_callsigns)))
+
+        for callsign in changed_callsigns:
+            if callsign in participants:
+                state.log_index.update(participants[callsign])
+            else:
+                state.log_index.remove(callsign)
+                removeUbnReport(callsign, results_dir)
+
+        with metrics.stage("check"):
+            ubn_callsigns = recheckLogs(participants, changed_callsigns, start_date, end_date, qso_repeat_period,
+                                        qso_time_difference, state.log_index, pair_matching, rules)
+
+    if suggest_calls:
+        # The proposals depend on all the logs - the UBN reports with changed proposals are written again
+        with metrics.stage("busted_calls"):
+            suggested = suggestBustedCalls(participants, qso_time_difference, state.log_index, rules=rules)
+        if ubn_callsigns is not None:
+            ubn_callsigns |= suggested
+
+    if state_filename is not None:
+        saveCheckedState(state, state_filename)
+
+    with metrics.stage("write"):
+        if not ep:  # Normal contest
+            writeResults(participants, results_dir, ubn_callsigns, ubn_archive, rules)
+        else:  # Electron Progress contest
+            writeResultsElectronProgress(participants, results_dir, ubn_callsigns, ubn_archive, rules)
+
+    with metrics.stage("statistics"):
+        writeStatistics(participants, results_dir, start_date, end_date)
+
+    if sqlite_filename is not None:
+        with metrics.stage("sqlite"):
+            from sqlite_export import writeSqlite  # sqlite3 is imported only when needed
+            writeSqlite(participants, sqlite_filename, qso_time_difference, state.log_index, rules)
+
+    return participants
+
+
+def main(start_date, end_date, log_directory, qso_repeat_period_in_mins=30, qso_time_difference_in_mins=3, ep=0, jobs=1,
+         engine="python", incremental=False, use_cache=True, clear_cache=False, ubn_archive=False, metrics_json=None,
+         profile=False, watch=False, suggest_calls=True, sqlite=False, out_of_core=False, memory_mb=256,
+         pair_matching=False, rules_filename=None):
     """
 
     :param start_date: Date and time when the contest begins. Format is specified in qso.DATE_TIME_FORMAT (Example: "2016-12-26 0700")
     :type start_date: str
     :param end_date: Date and time when the contest ends. Format is specified in qso.DATE_TIME_FORMAT (Example: "2016-12-26 0700")
     :type end_date: str
-    :param log_directory: Full path to the directory containing the cabrilo files
+    :param log_directory: Full path to the directory containing the cabrilo files. Can be also zip file with the logs or
+     directory with zip files - the logs are read directly from the zip files.
     :type log_directory: str
     :param qso_repeat_period_in_mins: Period (in minutes) after which the QSO with the same station is allowed
     :type qso_repeat_period_in_mins: int
@@ -364,6 +456,44 @@ def main(start_date, end_date, log_directory, qso_repeat_period_in_mins=30, qso_
     :type qso_time_difference_in_mins: int
     :param ep: If this is an "ElctronProgress" contest
     :type ep: bool
+    :param jobs: Number of worker processes used for parsing and checking the logs
+    :type jobs: int
+    :param engine: "python" or "numpy" (see columnar_check.py). Both give the same results.
+    :type engine: str
+    :param incremental: Keep the checked logs in the results dir and check again only the logs that have been added,
+     changed or removed since the previous run (and the QSOs of the other logs made with them)
+    :type incremental: bool
+    :param use_cache: Keep the parsed logs in results/parse_cache so that unchanged files are not parsed again
+    :type use_cache: bool
+    :param clear_cache: Remove all the parsed logs from results/parse_cache before parsing
+    :type clear_cache: bool
+    :param ubn_archive: Write the UBN reports into a single zip file (results/UBN.zip)
+    :type ubn_archive: bool
+    :param metrics_json: If supplied the wall time of each stage and the counters of the log check are written into
+     this JSON file
+    :type metrics_json: str
+    :param profile: Profile the run with cProfile and write the statistics into results/profile.pstats (the worker
+     processes are not profiled)
+    :type profile: bool
+    :param watch: Keep running and update the results whenever logs are added, changed or removed (implies
+     incremental)
+    :type watch: bool
+    :param suggest_calls: Propose the probably intended callsign for the QSOs that are not found in the other log (see
+     busted_calls.py)
+    :type suggest_calls: bool
+    :param sqlite: Write all the participants and checked QSOs into SQLite database (results/qsos.sqlite)
+    :type sqlite: bool
+    :param out_of_core: Check the logs without keeping all of them in memory (see out_of_core.py). The busted calls
+     are not proposed, so suggest_calls must be False (the UBN reports would differ from the normal check).
+    :type out_of_core: bool
+    :param memory_mb: Memory used by the out of core check for sorting the QSOs (in MB)
+    :type memory_mb: int
+    :param pair_matching: Match both sides of each contact once and copy the dupes and date errors into the linked QSO
+     of the other log (see pair_matching.py). The results differ from the official BFRA software.
+    :type pair_matching: bool
+    :param rules_filename: Config file with the rules of the contest (see contest_rules.py and rules_example.ini). The
+     rules of the LZ contests are used if None.
+    :type rules_filename: str
     :return:
     """
 
@@ -371,36 +501,150 @@ def main(start_date, end_date, log_directory, qso_repeat_period_in_mins=30, qso_
         raise ValueError("Incorrect --start param format, should be: yyyy-mm-dd hhmm")
     if not is_valid_date_time_format(end_date):
         raise ValueError("Incorrect --end param format, should be: yyyy-mm-dd hhmm")
+    if out_of_core and (incremental or watch or sqlite or engine != "python"):
+        raise ValueError("--out_of_core can't be used with --incremental, --watch, --sqlite or --engine=numpy")
+    if out_of_core and suggest_calls:
+        raise ValueError("--out_of_core doesn't propose the busted calls - use it with --no_call_suggestions")
+    if pair_matching and (out_of_core or engine != "python"):
+        raise ValueError("--pair_matching can't be used with --out_of_core or --engine=numpy")
+
+    rules = loadRules(rules_filename) if rules_filename is not None else DEFAULT_RULES
+    if rules != DEFAULT_RULES and engine != "python":
+        raise ValueError("--rules can't be used with --engine=numpy")
+
+    # Write the results into the "/results" dir (into "<zip name>_results" next to the zip file if the logs are in zip
+    # file)
+    results_dir = getResultsDir(log_directory)
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+
+    metrics.reset(metrics_json is not None)
+
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    if watch:
+        incremental = True  # The checked state is kept between the updates
+
+    # The state of the previous run (only the changed logs are checked again)
+    state_filename = os.path.join(results_dir, "checked_state.pickle")
+    parameters = (start_date, end_date, qso_repeat_period_in_mins, qso_time_difference_in_mins, suggest_calls,
+                  pair_matching, rules)
+    state = None
+    if incremental:
+        state = loadCheckedState(state_filename, parameters)
+    if state is None:
+        state = CheckedState(parameters)
 
     # Parse the logs
-    participants = parseLogs(log_directory)
+    cache_dir = os.path.join(results_dir, "parse_cache")
+    if clear_cache:
+        parse_cache.clearCache(cache_dir)
+    if not use_cache:
+        cache_dir = None
+
+    if out_of_core:
+        from out_of_core import checkOutOfCore
+        statistics = checkOutOfCore(log_directory, results_dir, start_date, end_date, qso_repeat_period_in_mins,
+                                    qso_time_difference_in_mins, ep, ubn_archive, cache_dir, memory_mb, rules)
+        finishRun(profiler, metrics_json, results_dir, len(statistics.rate), statistics.qsos)
+        return
+
+    watcher = None
+    if watch:
+        from log_watcher import LogWatcher
+        watcher = LogWatcher(log_directory)  # Created before the first check - no file change can be missed
+
+    sqlite_filename = os.path.join(results_dir, "qsos.sqlite") if sqlite else None
+
+    participants = updateResults(state, log_directory, results_dir, cache_dir, jobs, engine, ep, ubn_archive,
+                                 state_filename if incremental else None, sqlite_filename)
+
+    if watcher is not None:
+        import zipfile
+        logger.info("Watching for new or changed logs in: " + log_directory + " (press Ctrl+C to stop)")
+        try:
+            while True:
+                watcher.waitForChanges()
+                try:
+                    participants = updateResults(state, log_directory, results_dir, cache_dir, jobs, engine, ep,
+                                                 ubn_archive, state_filename, sqlite_filename)
+                except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+                    # A log removed or still being written after the change was noticed - the logs that failed to
+                    # parse are not stored in the checked state, so they are read again on the next change
+                    logger.warning("The results were not updated: " + repr(e) + " (waiting for the next change)")
+                    continue
+                logger.info("Results updated at " + datetime.now().strftime("%H:%M:%S"))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
 
-    # Check the logs
-    checkLog(participants, start_date, end_date, qso_repeat_period_in_mins, qso_time_difference_in_mins)
+    finishRun(profiler, metrics_json, results_dir, len(participants),
+              sum(len(participants[p].log) for p in participants))
 
-    # Write the results into the "/results" dir
-    results_dir = os.path.join(log_directory, "results")
-    if not os.path.exists(results_dir):
-        os.makedirs(results_dir)
 
-    if not ep:  # Normal contest
-        writeResults(participants, results_dir)
-    else:  # Electron Progress contest
-        writeResultsElectronProgress(participants, results_dir)
+def finishRun(profiler, metrics_json, results_dir, participant_count, qso_count):
+    """
+    Writes the profile and the metrics of the run (see --profile and --metrics_json)
+
+    :type profiler: cProfile.Profile
+    :type metrics_json: str
+    :type results_dir: str
+    :type participant_count: int
+    :type qso_count: int
+    """
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(results_dir, "profile.pstats"))
+        logger.info("Profile written to: " + os.path.join(results_dir, "profile.pstats") +
+                    " (view with: python -m pstats " + os.path.join(results_dir, "profile.pstats") + ")")
+
+    if metrics_json is not None:
+        metrics.count("participants", participant_count)
+        metrics.count("qsos", qso_count)
+        metrics.writeJson(metrics_json)
+        logger.info("Metrics written to: " + metrics_json)
 
 
 if __name__ == "__main__":
+    import multiprocessing
+    multiprocessing.freeze_support()  # Needed by the worker processes of the pyinstaller executable
+    setupLogging()
+
     parser = argparse.ArgumentParser(description='Log checking program for LZ contests. Written by LZ1ABC.')
     parser.add_argument("--start", type=str, required=True, help="Contest start time. Example: --start=\"2016-08-20 0800\"")
     parser.add_argument("--end", type=str, required=True, help="Contest end time. Example: --end=\"2016-08-20 1159\"")
-    parser.add_argument("--dir", type=str, required=True, help="Full path to the directory with the cabrilo logs. Example: --dir=\"C:\Plovdiv-2016-Logove\"")
+    parser.add_argument("--dir", type=str, required=True, help="Full path to the directory with the cabrilo logs (or zip file with the logs). Example: --dir=\"C:\Plovdiv-2016-Logove\"")
     parser.add_argument("--qso_repeat", type=int, default=30,  required=False, help="QSO repeat interval in minutes. Default is 30mins. Example: --qso_repeat=20")
     parser.add_argument("--crosscheck_diff", type=int, default=3, required=False, help="Allowed cross-check difference (in minutes) for QSO. Default is 3mins. Example: --crosscheck_diff=4")
     parser.add_argument("--ep", type=bool, default=False, required=False, help="Se to True if this is an ElectronProgress contest. Default is Flase. Example: --ep=True");
+    parser.add_argument("--jobs", type=int, default=1, required=False, help="Number of worker processes used for parsing and checking the logs. Default is 1. Example: --jobs=8")
+    parser.add_argument("--engine", type=str, default="python", choices=["python", "numpy"], required=False, help="Log checking engine. The numpy engine is faster for very large contests (requires numpy). Default is python. Example: --engine=numpy")
+    parser.add_argument("--incremental", action="store_true", required=False, help="Check again only the logs that have been added or changed since the previous run with the same parameters. Example: --incremental")
+    parser.add_argument("--no_cache", action="store_true", required=False, help="Parse all the logs again instead of using the parsed logs from results/parse_cache. Example: --no_cache")
+    parser.add_argument("--clear_cache", action="store_true", required=False, help="Remove the parsed logs from results/parse_cache before parsing. Example: --clear_cache")
+    parser.add_argument("--ubn_zip", action="store_true", required=False, help="Write all the UBN reports into a single zip file (results/UBN.zip) instead of the UBN directory. Example: --ubn_zip")
+    parser.add_argument("--no_call_suggestions", action="store_true", required=False, help="Don't propose the probably intended callsign for the QSOs that are not found in the other log (the UBN reports are as in the official BFRA software). Example: --no_call_suggestions")
+    parser.add_argument("--sqlite", action="store_true", required=False, help="Write all the participants and checked QSOs into SQLite database (results/qsos.sqlite). Example: --sqlite")
+    parser.add_argument("--out_of_core", action="store_true", required=False, help="Check the logs without keeping all of them in memory - the QSOs are sorted on disk (in results/). The busted calls are not proposed - requires --no_call_suggestions. Example: --out_of_core --no_call_suggestions")
+    parser.add_argument("--memory_mb", type=int, default=256, required=False, help="Memory used by --out_of_core for sorting the QSOs (in MB). Default is 256. Example: --memory_mb=100")
+    parser.add_argument("--pair_matching", action="store_true", required=False, help="Match both sides of each contact once and mark the QSOs linked with a dupe or with a QSO outside the contest (ERROR_PARTNER_DUPE, ERROR_PARTNER_DATE_TIME). The results differ from the official BFRA software. Example: --pair_matching")
+    parser.add_argument("--rules", type=str, default=None, required=False, help="Config file with the rules of the contest: repeat period per mode/band, compared exchange, points and multipliers (see rules_example.ini). Default are the rules of the LZ contests. Example: --rules=\"C:\\rules.ini\"")
+    parser.add_argument("--metrics_json", type=str, default=None, required=False, help="Write the time of each stage and the counters of the log check into JSON file. Example: --metrics_json=\"C:\metrics.json\"")
+    parser.add_argument("--watch", action="store_true", required=False, help="Keep running and update the results whenever logs are added or changed in --dir (implies --incremental). Example: --watch")
+    parser.add_argument("--profile", action="store_true", required=False, help="Profile the run and write the statistics into results/profile.pstats. Example: --profile")
     args = parser.parse_args()
     argsdict = vars(args)
 
-    main(argsdict["start"], argsdict["end"], argsdict["dir"], argsdict["qso_repeat"], argsdict["crosscheck_diff"], argsdict["ep"])
+    main(argsdict["start"], argsdict["end"], argsdict["dir"], argsdict["qso_repeat"], argsdict["crosscheck_diff"], argsdict["ep"], argsdict["jobs"],
+         argsdict["engine"], argsdict["incremental"], not argsdict["no_cache"], argsdict["clear_cache"],
+         argsdict["ubn_zip"], argsdict["metrics_json"], argsdict["profile"], argsdict["watch"],
+         not argsdict["no_call_suggestions"], argsdict["sqlite"], argsdict["out_of_core"], argsdict["memory_mb"],
+         argsdict["pair_matching"], argsdict["rules"])
 
     # is_ep = False
     # start = "2016-08-20 0800"
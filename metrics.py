@@ -0,0 +1,130 @@
+import contextlib
+import json
+import time
+
+
+class Metrics:
+    """
+    Wall time of the stages of the log check and counters from the hot loops (see --metrics_json).
+
+    The stages measured in the worker processes (--jobs) overlap, so their sum is kept apart in "worker_stages" - it is
+    the CPU time of the workers, not the wall time of the stage.
+
+    The hot loops must check "enabled" before counting anything, so the disabled metrics cost a single attribute lookup.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stages = {}  #:type : dict of {stage name: seconds}
+        self.worker_stages = {}  #:type : dict of {stage name: seconds summed over the worker processes}
+        self.counters = {}  #:type : dict of {counter name: int or dict of {key: int}}
+
+
+    def reset(self, enabled):
+        """
+        Removes all the measurements
+
+        :param enabled: If the measurements are to be collected
+        :type enabled: bool
+        """
+        self.__init__(enabled)
+
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Measures the wall time of a stage. Example: with metrics.stage("parse"): ...
+
+        :type name: str
+        """
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addTime(name, time.perf_counter() - begin)
+
+
+    def timed(self, name, function):
+        """
+        :return: The function wrapped so that the time spent in it is added to the stage
+        """
+        def wrapper(*args, **kwargs):
+            begin = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.addTime(name, time.perf_counter() - begin)
+        return wrapper
+
+
+    def addTime(self, name, seconds):
+        """
+        :param name: Name of the stage
+        :type name: str
+        :type seconds: float
+        """
+        if self.enabled:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+    def count(self, name, value=1):
+        """
+        :param name: Name of the counter
+        :type name: str
+        :type value: int
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+    def countBy(self, name, key, value=1):
+        """
+        Counts by key. Example: metrics.countBy("files_per_encoding", "utf-8")
+
+        :param name: Name of the counter
+        :type name: str
+        :type key: str
+        :type value: int
+        """
+        if self.enabled:
+            counter = self.counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+
+    def merge(self, other):
+        """
+        Adds the measurements of a worker process (see toDict()). Its stages are added to the worker_stages.
+
+        :type other: dict
+        """
+        if self.enabled:
+            for stages in (other["stages"], other["worker_stages"]):
+                for name, seconds in stages.items():
+                    self.worker_stages[name] = self.worker_stages.get(name, 0.0) + seconds
+        for name, value in other["counters"].items():
+            if isinstance(value, dict):
+                for key, key_value in value.items():
+                    self.countBy(name, key, key_value)
+            else:
+                self.count(name, value)
+
+
+    def toDict(self):
+        """
+        :rtype: dict
+        """
+        return {"stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+                "worker_stages": {name: round(seconds, 6) for name, seconds in self.worker_stages.items()},
+                "counters": self.counters}
+
+
+    def writeJson(self, filename):
+        """
+        :param filename: Where the metrics will be written
+        :type filename: str
+        """
+        with open(filename, "w") as f:
+            json.dump(self.toDict(), f, indent=2, sort_keys=True)
+
+
+metrics = Metrics()  # Shared by all the modules of the log check. Enabled by --metrics_json
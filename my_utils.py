@@ -1,5 +1,3 @@
-from bs4 import UnicodeDammit
-
 def representsInt(s):
     """
     Checks if string represents integer
@@ -16,16 +14,57 @@ def representsInt(s):
         return False
 
 
-def getFileEncoding(filename):
+# Size of the sample (in bytes) on which the character encoding detection is run
+ENCODING_DETECTION_SAMPLE_SIZE = 64 * 1024
+
+
+def detectEncoding(raw):
     """
-    Returns the character encoding of a file using Dammit
+    Returns the character encoding of bytes that are neither ASCII nor UTF-8 (see decodeBytes()). The detection of
+    Dammit is run on the first ENCODING_DETECTION_SAMPLE_SIZE bytes only.
 
-    :param filename: path to the file
-    :type filename: str
+    :param raw: Contents of a file
+    :type raw: bytes
     :return: String of the type "latin-1"
     :rtype: str
     """
-    raw = open(filename, "rb").read()
-    dammit = UnicodeDammit(raw)
+    from bs4 import UnicodeDammit  # Slow to import and needed only for the logs that are not ASCII or UTF-8
+
+    dammit = UnicodeDammit(raw[:ENCODING_DETECTION_SAMPLE_SIZE])
+
+    return dammit.original_encoding or "latin-1"
+
+
+def decodeBytes(raw):
+    """
+    Decodes the contents of a file. Line endings are translated to "\\n" as when the file is opened in text mode.
+
+    Plain ASCII and UTF-8 are tried first as this is what most of the logs are - the text of the attempt that succeeds
+    is used, so such files are decoded once. The encoding of the other files is detected (see detectEncoding()).
+
+    :param raw: Contents of a file
+    :type raw: bytes
+    :return: The decoded text, the encoding that was used and True if some of the bytes could not be decoded (they are
+     replaced with U+FFFD)
+    :rtype: (str, str, bool)
+    """
+    text = None
+    has_errors = False
+
+    if raw.isascii():
+        text, encoding = raw.decode("ascii"), "ascii"
+    else:
+        try:
+            text, encoding = raw.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            encoding = detectEncoding(raw)
+
+    if text is None:
+        try:
+            text = raw.decode(encoding)
+        except UnicodeDecodeError:
+            text = raw.decode(encoding, errors="replace")
+            has_errors = True
 
-    return dammit.original_encoding
+    # Universal newlines
+    return text.replace("\r\n", "\n").replace("\r", "\n"), encoding, has_errors
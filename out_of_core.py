@@ -0,0 +1,411 @@
+import heapq
+import itertools
+import os
+import pickle
+import shutil
+import tempfile
+from operator import itemgetter
+
+from contest_rules import DEFAULT_RULES
+from contest_statistics import ContestStatistics
+from cross_check import doCrossCheck, isDupe
+from dupe_checker import DupeChecker
+from log_files import findLogFiles, closeZipFiles
+from log_parser import parseLogFile, collectParsedLogs
+from metrics import metrics
+from participant import Participant
+from qso import Qso, parseDateTime
+from results_writer import getUbnFilename, writeUbnReport, writeClassification, writeClassificationElectronProgress
+
+# Estimated memory of a QSO waiting in a run (the Qso object, its integers and the record tuple). Used to turn the
+# memory budget into number of records.
+RECORD_SIZE = 500
+
+MIN_RECORDS = 1024  # The smallest buffer of the sorter
+MAX_OPEN_RUNS = 64  # More runs are merged in several steps
+
+
+class ExternalSorter:
+    """
+    Sorts more records than fit into the memory: the records are collected into a buffer which is sorted and written
+    into a run file whenever it is full. merge() reads the runs back as a single sorted stream.
+    """
+
+    def __init__(self, temp_dir, key, max_records):
+        """
+        :param temp_dir: Directory for the run files
+        :type temp_dir: str
+        :param key: Sort key of the records. Must be unique - the rest of the record is never compared.
+        :type key: callable
+        :param max_records: Number of records kept in memory
+        :type max_records: int
+        """
+        self.temp_dir = temp_dir
+        self.key = key
+        self.max_records = max(max_records, MIN_RECORDS)
+        # Records pickled together - a merge keeps one chunk of each open run in memory
+        self.chunk_size = max(16, self.max_records // MAX_OPEN_RUNS)
+        self.buffer = []
+        self.runs = []  #:type : list of str
+        self.count = 0
+
+
+    def add(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.max_records:
+            self._spill()
+
+
+    def _spill(self):
+        self.buffer.sort(key=self.key)
+        self.runs.append(self._writeRun(self.buffer))
+        self.buffer = []
+
+
+    def _writeRun(self, records):
+        fd, filename = tempfile.mkstemp(suffix=".run", dir=self.temp_dir)
+        with os.fdopen(fd, "wb") as f:
+            chunk = []
+            for record in records:
+                chunk.append(record)
+                if len(chunk) == self.chunk_size:
+                    pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    chunk = []
+            if chunk:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += 1
+        return filename
+
+
+    def _readRun(self, filename):
+        with open(filename, "rb") as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    break
+                yield from chunk
+        os.remove(filename)
+
+
+    def merge(self):
+        """
+        :return: All the added records sorted by the key
+        :rtype: iterator
+        """
+        if not self.runs:  # Everything fits into the memory
+            self.buffer.sort(key=self.key)
+            records, self.buffer = self.buffer, []
+            return iter(records)
+
+        if self.buffer:
+            self._spill()
+        while len(self.runs) > MAX_OPEN_RUNS:
+            runs, self.runs = self.runs[:MAX_OPEN_RUNS], self.runs[MAX_OPEN_RUNS:]
+            self.runs.append(self._writeRun(heapq.merge(*[self._readRun(run) for run in runs], key=self.key)))
+
+        runs, self.runs = self.runs, []
+        return heapq.merge(*[self._readRun(run) for run in runs], key=self.key)
+
+
+def checkOutOfCore(log_directory, results_dir, start_date_time, end_date_time, qso_repeat_period=30,
+                   qso_time_difference=3, ep=False, ubn_archive=False, cache_dir=None, memory_mb=256,
+                   rules=DEFAULT_RULES):
+    """
+    Checks the logs without keeping all of them in memory and writes the results. Gives the same error codes and
+    reports as logchecker_lzhfqrp.checkLog() + writeResults() (the busted calls are not proposed).
+
+    The result of a QSO depends only on the QSOs made between the same two stations (the "30min rule" and the
+    cross-check), so the QSOs are sorted on disk by (station pair, owner, position in the log) and each pair is checked
+    separately while the sorted runs are merged. The checked QSOs are sorted again by (owner, position) and the UBN
+    reports are written one log at a time.
+
+    :param log_directory: Directory with the cabrillo logs (or zip file with the logs)
+    :type log_directory: str
+    :param results_dir: Where the results are written
+    :type results_dir: str
+    :param start_date_time: contest start time
+    :param end_date_time: contest end time
+    :param qso_repeat_period: period after which the QSO with the same station is allowed
+    :type qso_repeat_period: int
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param ep: If this is an "ElctronProgress" contest
+    :type ep: bool
+    :param ubn_archive: Write the UBN reports into a single zip file (results/UBN.zip)
+    :type ubn_archive: bool
+    :param cache_dir: Directory of the parsed-log cache. No cache is used if None.
+    :type cache_dir: str
+    :param memory_mb: Memory used for the sorting of the QSOs (in MB). Half of it for each of the two sorts - the
+     sorters of the pairs checked in the second pass (see _checkPairs()) take theirs from the half of the first sort.
+    :type memory_mb: int
+    :param rules: The rules of the contest
+    :type rules: ContestRules
+    :return: The statistics of the contest (also written into results_dir)
+    :rtype: ContestStatistics
+    """
+    max_records = memory_mb * 1024 * 1024 // RECORD_SIZE // 2
+    temp_dir = tempfile.mkdtemp(prefix="runs-", dir=results_dir)
+
+    try:
+        pairs = ExternalSorter(temp_dir, itemgetter(0, 1, 2, 3, 4), max_records)
+        with metrics.stage("parse"):
+            headers, order, needed_logs = _parseIntoRuns(log_directory, start_date_time, end_date_time, cache_dir,
+                                                         pairs)
+
+        logs = ExternalSorter(temp_dir, itemgetter(0, 1), max_records)
+        with metrics.stage("check"):
+            # The sorters of the second pass hold a small part of the QSOs - they share the memory of the pairs
+            for record in _checkPairs(pairs.merge(), headers, qso_repeat_period, qso_time_difference, needed_logs,
+                                      rules, temp_dir, max_records // 4):
+                logs.add(record)
+
+        with metrics.stage("write"):
+            statistics = _writeResults(logs.merge(), headers, order, results_dir, start_date_time, end_date_time, ep,
+                                       ubn_archive, rules)
+
+        metrics.count("out_of_core_runs", pairs.count + logs.count)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    return statistics
+
+
+def _parseIntoRuns(log_directory, start_date_time, end_date_time, cache_dir, pairs):
+    """
+    Parses the logs one by one and adds their QSOs to the sorter: (first call of the pair, second call of the pair,
+    owner, file index, position in the log, Qso)
+
+    :return: {callsign: (file index, name, category, encoding)} of the used logs, the callsigns in the order of
+     log_parser.parseLogs() and the (callsign, his_call) parts of the logs needed by QSOs with unusual own call
+    :rtype: (dict, list of str, set of (str, str))
+    """
+    start = parseDateTime(start_date_time)
+    end = parseDateTime(end_date_time)
+
+    headers = {}
+    order = []
+    needed_logs = set()
+
+    try:
+        for file_index, filename in enumerate(findLogFiles(log_directory)):
+            parsed = parseLogFile(filename, cache_dir)
+            participant = collectParsedLogs([filename], [parsed])[0]
+            callsign = participant.callsign
+            if not len(callsign):
+                continue
+
+            # As in parseLogs() the last file of a callsign is used - the QSOs of the others are dropped when merged
+            if callsign not in headers:
+                order.append(callsign)
+            headers[callsign] = (file_index, participant.name, participant.category, participant.encoding)
+
+            for position, qso in enumerate(participant.log):
+                qso.ledger = None  # The ledger is built again when the log is written
+                if qso.minute < start or qso.minute > end:
+                    qso.error_code = Qso.ERROR_DATE_TIME
+                if qso.call != callsign:
+                    needed_logs.add((qso.his_call, qso.call))  # The cross-check looks for his_call -> call QSOs
+
+                if callsign <= qso.his_call:
+                    pairs.add((callsign, qso.his_call, callsign, file_index, position, qso))
+                else:
+                    pairs.add((qso.his_call, callsign, callsign, file_index, position, qso))
+    finally:
+        closeZipFiles()  # Kept open while the logs are read one by one
+
+    return headers, order, needed_logs
+
+
+def _checkPairs(records, headers, qso_repeat_period, qso_time_difference, needed_logs, rules, temp_dir, max_records):
+    """
+    Checks the QSOs of each station pair (see logchecker_lzhfqrp.checkParticipant())
+
+    A QSO whose own call differs from the callsign of the log is cross-checked against the QSOs of his_call made with
+    that call - a part of another station pair. The pairs with such QSOs are checked after all the others in three
+    passes over sorters, so nothing is collected in memory:
+    1. the QSOs of these pairs are sorted again and so are the needed parts of the other pairs, each one next to the
+       QSOs that are cross-checked against it
+    2. the cross-check of these QSOs (see _crossCheckUnusualCalls())
+    3. these pairs are checked with the results of the cross-check
+
+    :param records: The QSOs sorted by station pair (see _parseIntoRuns())
+    :param temp_dir: Directory for the run files
+    :type temp_dir: str
+    :param max_records: Number of records kept in memory by each of the sorters
+    :type max_records: int
+    :return: Generator of the checked QSOs: (owner, position in the log, Qso)
+    """
+    postponed = ExternalSorter(temp_dir, itemgetter(0, 1, 2, 3, 4), max_records)  # The records of the pairs
+    # The needed parts of the pairs: (callsign, his_call, 0, callsign, position, Qso) and the QSOs cross-checked against
+    # them: (his_call, call, 1, owner, position, Qso, first call of the pair, second call of the pair, file index)
+    probes = ExternalSorter(temp_dir, itemgetter(0, 1, 2, 3, 4), max_records)
+
+    for pair, group in itertools.groupby(records, key=itemgetter(0, 1)):
+        group = [record for record in group if headers[record[2]][0] == record[3]]  # Only the used file of the owner
+
+        logs = {}  #:type : dict of {owner: list of (position, Qso)}
+        for _, _, owner, _, position, qso in group:
+            logs.setdefault(owner, []).append((position, qso))
+
+        unusual = False
+        for owner, entries in logs.items():
+            his_call = entries[0][1].his_call
+            if (owner, his_call) in needed_logs:
+                for position, qso in entries:
+                    probes.add((owner, his_call, 0, owner, position, qso))
+            unusual = unusual or any(qso.call != owner for _, qso in entries)
+
+        if not unusual:
+            yield from _checkPair(logs, headers, qso_repeat_period, qso_time_difference, rules)
+            continue
+
+        # The other pair needed by the cross-check may come later
+        for record in group:
+            postponed.add(record)
+            _, _, owner, file_index, position, qso = record
+            if qso.call != owner and not qso.isInvalid() and qso.his_call in headers:
+                probes.add((qso.his_call, qso.call, 1, owner, position, qso) + pair + (file_index,))
+
+    outcomes = ExternalSorter(temp_dir, itemgetter(0, 1, 2, 3, 4), max_records)
+    for outcome in _crossCheckUnusualCalls(probes.merge(), qso_time_difference, rules):
+        outcomes.add(outcome)
+
+    # The outcome of a QSO has the same key as the QSO - it comes right after it
+    merged = heapq.merge(postponed.merge(), outcomes.merge(), key=itemgetter(0, 1, 2, 3, 4))
+    for _, group in itertools.groupby(merged, key=itemgetter(0, 1)):
+        logs = {}
+        cross_checked = {}  #:type : dict of {(owner, position): (error_code, error_info)}
+        for record in group:
+            if len(record) == 7:
+                cross_checked[(record[2], record[4])] = record[5:]
+            else:
+                logs.setdefault(record[2], []).append((record[4], record[5]))
+        yield from _checkPair(logs, headers, qso_repeat_period, qso_time_difference, rules, cross_checked)
+
+    metrics.count("out_of_core_runs", postponed.count + probes.count + outcomes.count)
+
+
+def _crossCheckUnusualCalls(probes, qso_time_difference, rules):
+    """
+    Cross-checks the QSOs whose own call differs from the callsign of the log. Each QSO is cross-checked as if it
+    reached the cross-check in _checkPair() - the result is used only if the QSO is not a dupe.
+
+    :param probes: The parts of the pairs and the QSOs cross-checked against them, sorted (see _checkPairs())
+    :return: Generator of (first call of the pair, second call of the pair, owner, file index, position, error code,
+     error info)
+    """
+    partner = _PartnerLog()
+    for (his_call, _), group in itertools.groupby(probes, key=itemgetter(0, 1)):
+        partner.callsign = his_call
+        partner.log = []
+        for record in group:
+            qso = record[5]
+            if record[2] == 0:
+                partner.log.append(qso)  # The part of the log comes first, in log order
+                continue
+
+            doCrossCheck(qso, None, partner, qso_time_difference, rules=rules)
+            yield record[6], record[7], record[3], record[8], record[4], qso.error_code, qso.error_info
+
+            # The QSO may be the same object as the postponed one - it is checked again in log order
+            qso.error_code = Qso.NO_ERROR
+            qso.error_info = ""
+
+
+class _PartnerLog:
+    """
+    The log of the other station as seen by doCrossCheck() (only the callsign and the QSOs). The QSOs belong to
+    another Participant, so they can't be added to one here - that would move them into its ledger.
+    """
+    __slots__ = ("callsign", "log")
+
+
+def _checkPair(logs, headers, qso_repeat_period, qso_time_difference, rules, cross_checked=None):
+    """
+    :param logs: The QSOs of the pair: {owner: list of (position, Qso)}
+    :param cross_checked: The results of the QSOs with unusual own call (see _crossCheckUnusualCalls())
+    :type cross_checked: dict of {(owner, position): (error_code, error_info)}
+    """
+    partner = _PartnerLog()
+    for owner, entries in logs.items():
+        his_call = entries[0][1].his_call
+        partner.callsign = his_call
+        partner.log = [qso for _, qso in logs.get(his_call, ())]
+        dupe_checker = DupeChecker(qso_repeat_period, rules)
+
+        for position, qso in entries:
+            if qso.isInvalid():
+                pass  # Rejected because of the date and time
+
+            elif his_call not in headers:
+                qso.error_code = Qso.ERROR_PARTNER_LOG_MISSING
+
+            elif isDupe(qso, None, qso_repeat_period, dupe_checker):
+                pass
+
+            elif qso.call != owner:
+                qso.error_code, qso.error_info = cross_checked[(owner, position)]
+                if qso.isValid():
+                    dupe_checker.addValid(qso, position)
+
+            elif doCrossCheck(qso, None, partner, qso_time_difference, rules=rules):
+                dupe_checker.addValid(qso, position)
+
+            yield owner, position, qso
+
+
+def _writeResults(records, headers, order, results_dir, start_date_time, end_date_time, ep, ubn_archive, rules):
+    """
+    Writes the UBN report of each log as soon as its QSOs are read and the results at the end
+
+    :param records: The checked QSOs sorted by (owner, position)
+    :rtype: ContestStatistics
+    """
+    statistics = ContestStatistics(start_date_time, end_date_time)
+    results = {}
+
+    ubn_zip = None
+    ubn_dir = os.path.join(results_dir, "UBN")
+    if ubn_archive:
+        import zipfile
+        ubn_zip = zipfile.ZipFile(os.path.join(results_dir, "UBN.zip"), "w", compression=zipfile.ZIP_DEFLATED)
+    elif not os.path.exists(ubn_dir):
+        os.makedirs(ubn_dir)
+
+    try:
+        owners = itertools.groupby(records, key=itemgetter(0))
+        owner, qsos = next(owners, (None, ()))
+
+        for callsign in sorted(headers):
+            _, name, category, encoding = headers[callsign]
+            participant = Participant(callsign, name, category)
+            participant.encoding = encoding
+            if owner == callsign:
+                for _, _, qso in qsos:
+                    participant.addQso(qso)
+                owner, qsos = next(owners, (None, ()))
+
+            if ep:
+                results[callsign] = (participant.isElectronProgressStation(rules), participant.getResultsEP(rules))
+            else:
+                results[callsign] = participant.getResults(rules)
+            statistics.add(participant)
+
+            if ubn_zip is not None:
+                ubn_zip.writestr(getUbnFilename(callsign), "".join(participant.getUbnReportLines()).encode("utf-8"))
+            else:
+                writeUbnReport(participant, ubn_dir)
+    finally:
+        if ubn_zip is not None:
+            ubn_zip.close()
+
+    # The results in the order of parseLogs() - the participants with equal points are in the same order
+    if ep:
+        writeClassificationElectronProgress([results[c][1] for c in order if results[c][0]],
+                                            [results[c][1] for c in order if not results[c][0]], results_dir)
+    else:
+        writeClassification([results[c] for c in order], results_dir)
+
+    statistics.write(results_dir)
+    return statistics
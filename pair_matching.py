@@ -0,0 +1,206 @@
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+from qso import Qso
+from dupe_checker import DupeChecker
+from cross_check import doCrossCheck
+from contest_rules import DEFAULT_RULES
+
+
+def matchPair(qsos_a, qsos_b, qso_time_difference, rules=DEFAULT_RULES):
+    """
+    Links the QSOs that two stations logged with each other - every QSO is linked with at most one QSO from the other
+    log. Of all the QSO pairs within the cross-check time window the best ones are linked first: matching exchanges in
+    both directions, then in one direction, then none; closer in time before farther; earlier in the logs before later.
+    The links don't depend on which of the two logs is checked first.
+
+    As in cross_check.doCrossCheck() a QSO can be linked with a QSO logged with its own call (qso.call == his_call of
+    the other QSO). The own call of the other QSO doesn't matter, so a QSO logged with another own call (e.g. LZ0AA/P in
+    the log of LZ0AA) can confirm the QSO of the other log but is not confirmed by it - such link is used only by one of
+    the two QSOs (see checkPair()).
+
+    e.g. LZ0DA has one QSO with LZ0DJ at 0801 and LZ0DJ has two with LZ0DA (0800 with a busted exchange and 0801). The
+    0801 QSOs are linked with each other and the 0800 QSO of LZ0DJ is left without a link.
+
+    :param qsos_a: (position, Qso) of the QSOs made with station B from the log of station A, sorted by time (see
+     LogIndex.index)
+    :type qsos_a: (list of int, list of (int, Qso))
+    :param qsos_b: The QSOs made with station A from the log of station B
+    :type qsos_b: (list of int, list of (int, Qso))
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param rules: The rules of the contest (the compared exchange)
+    :type rules: ContestRules
+    :return: The linked QSOs
+    :rtype: list of (Qso, Qso)
+    """
+    times_b, entries_b = qsos_b
+    is_received = rules.isReceivedCorrectly
+
+    pairs = []
+    for position_a, a in qsos_a[1]:
+        lo = bisect_left(times_b, a.minute - qso_time_difference)
+        hi = bisect_right(times_b, a.minute + qso_time_difference)
+        for position_b, b in entries_b[lo:hi]:
+            if a is b or (a.call != b.his_call and b.call != a.his_call):
+                continue
+            mismatches = (not is_received(b, a)) + (not is_received(a, b))
+            pairs.append((mismatches, abs(a.minute - b.minute), position_a, position_b, a, b))
+
+    pairs.sort(key=itemgetter(0, 1, 2, 3))
+
+    links = []
+    linked = set()
+    for _, _, _, _, a, b in pairs:
+        if id(a) not in linked and id(b) not in linked:
+            linked.add(id(a))
+            linked.add(id(b))
+            links.append((a, b))
+
+    return links
+
+
+def checkPair(participants, callsign_a, callsign_b, log_index, qso_repeat_period, qso_time_difference,
+              rules=DEFAULT_RULES):
+    """
+    Checks the QSOs that two stations logged with each other (the QSOs outside the contest must already be rejected).
+    The QSOs are linked (see matchPair()) and Qso.partner is set on the QSOs confirmed by the link, then each log is
+    checked in log order:
+
+    - QSO logged with another own call than the callsign of the log: cross-checked as in
+      logchecker_lzhfqrp.checkParticipant() (the other log has no QSOs with this call made with this log)
+    - QSO without link: ERROR_NOT_IN_LOG
+    - linked with a QSO outside the contest: ERROR_PARTNER_DATE_TIME
+    - the "30min rule" and the exchanges as in logchecker_lzhfqrp.checkParticipant()
+
+    At the end the valid QSOs linked with a dupe get ERROR_PARTNER_DUPE. The "30min rule" is checked before this, so
+    such QSO still counts as valid for the later QSOs of its log.
+
+    :param participants:
+    :type participants: dict of Participant
+    :param callsign_a: Station A (both logs must be in participants)
+    :type callsign_a: str
+    :param callsign_b: Station B (the same as A for the QSOs that A logged with itself)
+    :type callsign_b: str
+    :param log_index: Cross-check index of the logs
+    :type log_index: LogIndex
+    :param qso_repeat_period: period after which the QSO with the same station is allowed
+    :type qso_repeat_period: int
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param rules: The rules of the contest
+    :type rules: ContestRules
+    :return: Number of links
+    :rtype: int
+    """
+    no_qsos = ([], [])
+    qsos_a = log_index.index.get(callsign_a, {}).get(callsign_b, no_qsos)
+    qsos_b = log_index.index.get(callsign_b, {}).get(callsign_a, no_qsos)
+
+    sides = ((callsign_a, qsos_a),) if callsign_a == callsign_b else ((callsign_a, qsos_a), (callsign_b, qsos_b))
+    for _, (_, entries) in sides:
+        for _, qso in entries:
+            qso.partner = None
+
+    links = matchPair(qsos_a, qsos_b, qso_time_difference, rules)
+    is_received = rules.isReceivedCorrectly
+    for a, b in links:
+        if a.call == b.his_call:
+            a.partner = b
+        if b.call == a.his_call:
+            b.partner = a
+
+    for callsign, (_, entries) in sides:
+        dupe_checker = DupeChecker(qso_repeat_period, rules)
+
+        for position, qso in sorted(entries, key=itemgetter(0)):  # In log order - the entries are sorted by time
+            partner = qso.partner
+
+            if qso.isInvalid():
+                continue  # Rejected because of the date and time
+
+            dupe = dupe_checker.findDupe(qso)
+            if dupe is not None:
+                qso.error_code = Qso.ERROR_DUPE  # Violating the "30min rule"
+                qso.error_info = dupe.toCabrillo()
+
+            elif qso.call != callsign:
+                if doCrossCheck(qso, participants[callsign], participants[qso.his_call], qso_time_difference,
+                                log_index, rules):
+                    dupe_checker.addValid(qso, position)
+
+            elif partner is None:
+                qso.error_code = Qso.ERROR_NOT_IN_LOG
+
+            elif partner.error_code == Qso.ERROR_DATE_TIME:
+                qso.error_code = partner.translatePartnerError()
+                qso.error_info = partner.toCabrillo()
+
+            elif not is_received(partner, qso):
+                qso.error_code = Qso.ERROR_PARTNER_RECEIVE
+                qso.error_info = partner.toCabrillo()
+
+            elif not is_received(qso, partner):
+                qso.error_code = Qso.ERROR_RECEIVE
+                qso.error_info = partner.toCabrillo()
+
+            else:
+                dupe_checker.addValid(qso, position)  # Only valid QSOs count for the "30min rule"
+
+    # Both logs are checked - the dupes are known on both sides
+    for a, b in links:
+        if a.partner is b and a.isValid() and b.error_code == Qso.ERROR_DUPE:
+            a.error_code = b.translatePartnerError()
+            a.error_info = b.toCabrillo()
+        elif b.partner is a and b.isValid() and a.error_code == Qso.ERROR_DUPE:
+            b.error_code = a.translatePartnerError()
+            b.error_info = a.toCabrillo()
+
+    return len(links)
+
+
+def checkLogPairs(participants, qso_repeat_period, qso_time_difference, log_index, callsigns=None, rules=DEFAULT_RULES):
+    """
+    Checks the logs pair by pair: the QSOs that two stations logged with each other are matched once for both logs
+    (see checkPair()) instead of searching the log of B for each QSO of A and then the log of A for each QSO of B. The
+    QSOs outside the contest must already be rejected.
+
+    :param participants:
+    :type participants: dict of Participant
+    :param qso_repeat_period: period after which the QSO with the same station is allowed
+    :type qso_repeat_period: int
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param log_index: Cross-check index of the logs
+    :type log_index: LogIndex
+    :param callsigns: If supplied only the pairs with at least one of these stations are checked (see
+     logchecker_lzhfqrp.recheckLogs())
+    :type callsigns: set of str
+    :param rules: The rules of the contest
+    :type rules: ContestRules
+    :return: Number of links
+    :rtype: int
+    """
+    link_count = 0
+
+    for callsign in participants:
+        entries = log_index.index.get(callsign, {})
+
+        for his_call, qsos in entries.items():
+            if callsigns is not None and callsign not in callsigns and his_call not in callsigns:
+                continue
+
+            if his_call not in participants:
+                for _, qso in qsos[1]:
+                    qso.partner = None
+                    if qso.isValid():
+                        qso.error_code = Qso.ERROR_PARTNER_LOG_MISSING
+                continue
+
+            if his_call < callsign and callsign in log_index.index.get(his_call, {}):
+                continue  # Checked together with the log of his_call
+
+            link_count += checkPair(participants, callsign, his_call, log_index, qso_repeat_period,
+                                    qso_time_difference, rules)
+
+    return link_count
@@ -0,0 +1,70 @@
+import hashlib
+import os
+import pickle
+import shutil
+
+
+# Increase when the parsing of the logs (or the Participant/Qso classes) changes. Invalidates all cached logs.
+PARSER_VERSION = 6
+
+
+def getCacheKey(filename, raw):
+    """
+    Returns the key under which the parsed log is cached. The key changes when the file contents or PARSER_VERSION
+    change.
+
+    :param filename: Path to the log file (it is part of the messages that are cached together with the log)
+    :type filename: str
+    :param raw: Contents of the file
+    :type raw: bytes
+    :rtype: str
+    """
+    sha1 = hashlib.sha1()
+    sha1.update(str(PARSER_VERSION).encode("ascii"))
+    sha1.update(b"\0")
+    sha1.update(os.path.abspath(filename).encode("utf-8", errors="surrogateescape"))
+    sha1.update(b"\0")
+    sha1.update(raw)
+    return sha1.hexdigest()
+
+
+def loadParsedLog(cache_dir, key):
+    """
+    :param cache_dir: Directory of the cache
+    :type cache_dir: str
+    :type key: str
+    :return: The cached value or None if not found
+    """
+    try:
+        with open(os.path.join(cache_dir, key + ".pickle"), "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return None  # Missing or damaged entry - the log will be parsed again
+
+
+def storeParsedLog(cache_dir, key, value):
+    """
+    :param cache_dir: Directory of the cache
+    :type cache_dir: str
+    :type key: str
+    :param value: The parsed log
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Write into temp file first - parallel runs (or workers) must never see partially written entries
+    filename = os.path.join(cache_dir, key + ".pickle")
+    tmp_filename = filename + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_filename, filename)
+
+
+def clearCache(cache_dir):
+    """
+    Removes all the cached logs
+
+    :param cache_dir: Directory of the cache
+    :type cache_dir: str
+    """
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
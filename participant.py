@@ -1,4 +1,6 @@
 from qso import Qso
+from score_ledger import ScoreLedger
+from contest_rules import DEFAULT_RULES
 
 
 class Participant:
@@ -7,9 +9,46 @@ class Participant:
         self.callsign = callsign
         self.category = category
         self.name = name
+        self.encoding = ""  # character encoding of the log file (for diagnostics)
 
-        """:type : list of Qso"""
-        self.log = [] #:type : list of Qso
+        self._log = []  #:type : list of Qso
+
+        self.ledger = ScoreLedger()  # valid/invalid counts and multipliers - kept up to date by the QSOs
+
+
+    @property
+    def log(self):
+        """
+        The QSOs in log order. The list must not be changed directly - the QSOs are added with addQso() which keeps the
+        ledger up to date.
+
+        :rtype: list of Qso
+        """
+        return self._log
+
+
+    @log.setter
+    def log(self, qsos):
+        """
+        Replaces the QSOs of the log and builds the ledger again from them
+
+        :type qsos: list of Qso
+        """
+        self._log = []
+        self.ledger = ScoreLedger()
+        for qso in qsos:
+            self.addQso(qso)
+
+
+    def addQso(self, qso):
+        """
+        Appends the QSO to the log
+
+        :type qso: Qso
+        """
+        self._log.append(qso)
+        qso.ledger = self.ledger
+        self.ledger.add(qso)
 
 
     def __str__(self):
@@ -27,11 +66,7 @@ class Participant:
         :return: Number of valid Qsos
         :rtype: int
         """
-        i = 0
-        for q in self.log:
-            if q.error_code == Qso.NO_ERROR:
-                i += 1
-        return i
+        return self.ledger.valid_count
 
 
     def getAccuracy(self):
@@ -39,53 +74,50 @@ class Participant:
         :return: Percenage of successful QSOs
         :rtype: float
         """
-        if self.totalQsoCount() == 0:
+        total = self.totalQsoCount()
+        if total == 0:
             return 100
-        return (self.validQsoCount() / self.totalQsoCount()) * 100.0
+        return (self.validQsoCount() / total) * 100.0
 
 
-    def getPoints(self):
+    def getPoints(self, rules=DEFAULT_RULES):
         """
         Returns the final score of the participant.
+        :param rules: The rules of the contest
+        :type rules: ContestRules
         :return: Final score.
         :rtype: int
         """
-        return self.validQsoCount()*2
+        return rules.getPoints(self.ledger)
 
 
-    def isElectronProgressStation(self):
-        for q in self.log:
-            if str(q.snd2).upper() == "EP":
-                return True
-            else:
-                return False
+    def isElectronProgressStation(self, rules=DEFAULT_RULES):
+        return rules.isMultiplierStation(self)
 
-    def getResults(self):
+    def getResults(self, rules=DEFAULT_RULES):
         """
         List of strings: "Call, Total QSO, Confirmed QSO , Points, Accuracy"
+        :param rules: The rules of the contest
+        :type rules: ContestRules
         :return:
         :rtype: list of str
         """
-        return [self.callsign, self.totalQsoCount(), self.validQsoCount(), self.getPoints(), "{0:.2f}".format(self.getAccuracy()), self.category]
+        return [self.callsign, self.totalQsoCount(), self.validQsoCount(), self.getPoints(rules), "{0:.2f}".format(self.getAccuracy()), self.category]
 
 
-    def getResultsEP(self):
+    def getResultsEP(self, rules=DEFAULT_RULES):
         """
         List of strings: "Call, Total QSO, Confirmed QSO , Points, Multipliers, Score, Accuracy"
+        :param rules: The rules of the contest
+        :type rules: ContestRules
         :return:
         :rtype: list of str
         """
-        worked_ep_stations = []
-
-        for q in self.log:
-            if str(q.rcv2).lower() == "ep" and q.isValid():  # QSO with EP station
-                if q.his_call not in worked_ep_stations:
-                    worked_ep_stations.append(q.his_call)
-
-        mult = len(worked_ep_stations)
+        mult = rules.getMultipliers(self.ledger)  # Each worked EP station is a multiplier
+        points = self.getPoints(rules)
 
         return [self.callsign, self.totalQsoCount(), self.validQsoCount(),
-                self.getPoints(), mult, self.getPoints() * mult,
+                points, mult, points * mult,
                 self.getAccuracy()]
 
 
@@ -95,11 +127,7 @@ class Participant:
         :return: Number of invalid Qsos
         :rtype: int
         """
-        i = 0
-        for q in self.log:
-            if q.error_code != Qso.NO_ERROR:
-                i += 1
-        return i
+        return self.ledger.invalid_count
 
 
     def printUbnReport(self):
@@ -111,22 +139,26 @@ class Participant:
 
 
     def getUbnReport(self):
-        ubn = ""
-        ubn += "UBN for: "+self.callsign+"\n"
-        ubn += "Name: "+self.name+"\n"
-        ubn += "\n"
-        ubn += "--------------------------------------------------------------------------------"+"\n"
-        ubn += "Total QSOs: "+str(self.totalQsoCount())+"\n"
-        ubn += "Confirmed QSOs: "+str(self.validQsoCount())+"\n"
-        ubn += "--------------------------------------------------------------------------------"+"\n"
-        ubn += "\n"
+        return "".join(self.getUbnReportLines())
+
+
+    def getUbnReportLines(self):
+        """
+        Generator of the UBN report lines (each ends with a new line)
+
+        :rtype: generator of str
+        """
+        yield "UBN for: "+self.callsign+"\n"
+        yield "Name: "+self.name+"\n"
+        yield "\n"
+        yield "--------------------------------------------------------------------------------"+"\n"
+        yield "Total QSOs: "+str(self.totalQsoCount())+"\n"
+        yield "Confirmed QSOs: "+str(self.validQsoCount())+"\n"
+        yield "--------------------------------------------------------------------------------"+"\n"
+        yield "\n"
         for q in self.log:
             if q.error_code != Qso.NO_ERROR:
-                ubn += q.errorCodeToString(q.error_code) + ":\n"
-                ubn += str(q) + "\n"
                 if len(q.error_info) > 0:
-                    ubn += q.error_info
-                    ubn += "\n"
-                ubn += "\n"
-
-        return ubn
\ No newline at end of file
+                    yield q.errorCodeToString(q.error_code) + ":\n" + q.toCabrillo() + "\n" + q.error_info + "\n\n"
+                else:
+                    yield q.errorCodeToString(q.error_code) + ":\n" + q.toCabrillo() + "\n\n"
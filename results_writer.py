@@ -0,0 +1,205 @@
+import csv
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from contest_rules import DEFAULT_RULES
+
+UBN_WRITER_THREADS = 8  # Number of threads writing the UBN reports
+UBN_WRITE_BUFFER_SIZE = 256 * 1024
+
+
+def writeUbnReports(participants, to_dir, callsigns=None, archive=False):
+    """
+    Writes the UBN reports into the "UBN" sub-directory of to_dir
+
+    :param participants:
+    :type participants: dict of Participant
+    :param to_dir: Directory where results must be written
+    :param callsigns: If supplied only the reports of these participants are written
+    :type callsigns: set of str
+    :param archive: Write all the reports into a single zip file (UBN.zip) instead of separate files
+    :type archive: bool
+    :return:
+    """
+    if archive:
+        # A zip archive can't be updated in place - all the reports are written
+        import zipfile
+        with zipfile.ZipFile(os.path.join(to_dir, "UBN.zip"), "w", compression=zipfile.ZIP_DEFLATED) as ubn_zip:
+            for p in participants:
+                with ubn_zip.open(getUbnFilename(participants[p].callsign), "w") as ubn_file:
+                    ubn_file.write("".join(participants[p].getUbnReportLines()).encode("utf-8"))
+        return
+
+    ubn_dir = os.path.join(to_dir, "UBN")
+    if not os.path.exists(ubn_dir):
+        os.makedirs(ubn_dir) # Create UBN directory if not existing
+
+    # The writing is done in threads - most of the time is spent waiting for the disk
+    with ThreadPoolExecutor(max_workers=UBN_WRITER_THREADS) as executor:
+        for _ in executor.map(functools.partial(writeUbnReport, ubn_dir=ubn_dir),
+                              [participants[p] for p in participants if callsigns is None or p in callsigns]):
+            pass
+
+
+def writeUbnReport(participant, ubn_dir):
+    """
+    Writes the UBN report of a single participant
+
+    :type participant: Participant
+    :param ubn_dir: The "UBN" directory
+    :type ubn_dir: str
+    """
+    filename = os.path.join(ubn_dir, getUbnFilename(participant.callsign))
+    with open(filename, "w+", encoding="utf-8", buffering=UBN_WRITE_BUFFER_SIZE) as ubn_file:
+        ubn_file.writelines(participant.getUbnReportLines())
+
+
+def getUbnFilename(callsign):
+    """
+    :return: Name of the UBN report file of the participant
+    :rtype: str
+    """
+    return callsign.replace("/", "_") + ".UBN"
+
+
+def removeUbnReport(callsign, to_dir):
+    """
+    Removes the UBN report of a participant whose log has been removed
+
+    :type callsign: str
+    :param to_dir: Directory where results are written
+    """
+    filename = os.path.join(to_dir, "UBN", getUbnFilename(callsign))
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def writeResults(participants, to_dir, ubn_callsigns=None, ubn_archive=False, rules=DEFAULT_RULES):
+    """
+    Writes the results in the supplied dir (this includes stuff like general results, UBN and maybe more)
+
+    :param ep: If this is an Electron Progress contests (then we have to calculate also multipliers)
+    :type ep: bool
+    :param participants:
+    :type participants: list of Participants
+    :param to_dir: Directory where results must be written
+    :param ubn_callsigns: If supplied only the UBN reports of these participants are written
+    :type ubn_callsigns: set of str
+    :param ubn_archive: Write all the UBN reports into a single zip file (UBN.zip)
+    :type ubn_archive: bool
+    :param rules: The rules of the contest (the points and the multipliers)
+    :type rules: ContestRules
+    :rtype: str
+    :return:
+    """
+
+    # Create the classification - results.csv
+    # -----------------------------------------
+    list_classification = []
+
+    for p in participants:
+        list_classification.append(participants[p].getResults(rules))
+
+    writeClassification(list_classification, to_dir)
+
+    # Write the UBN reports
+    # -----------------------------------------
+    writeUbnReports(participants, to_dir, ubn_callsigns, ubn_archive)
+
+
+def writeClassification(list_classification, to_dir):
+    """
+    Sorts the results by points, adds the rank and writes them into results.csv
+
+    :param list_classification: Participant.getResults() of each participant
+    :type list_classification: list of list
+    :param to_dir: Directory where results must be written
+    """
+    list_classification = sorted(list_classification,
+                                 key=lambda list_classification: (list_classification[3], list_classification[4]),
+                                 reverse=True)  # Sort by points
+
+    # Add the rank
+    for idx, entry in enumerate(list_classification):
+        entry.insert(0, idx+1)
+
+    # Print the results into a CSV file called results.csv
+    filename = os.path.join(to_dir, "results.csv")
+    with open(filename, "w+", encoding="utf-8") as output:
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerows(list_classification)
+
+
+def writeResultsElectronProgress(participants, to_dir, ubn_callsigns=None, ubn_archive=False, rules=DEFAULT_RULES):
+    """
+    Writes the results in the supplied dir (this includes stuff like general results, UBN and maybe more)
+
+    :param participants:
+    :type participants: list of Participants
+    :param to_dir: Directory where results must be written
+    :param ubn_callsigns: If supplied only the UBN reports of these participants are written
+    :type ubn_callsigns: set of str
+    :param ubn_archive: Write all the UBN reports into a single zip file (UBN.zip)
+    :type ubn_archive: bool
+    :param rules: The rules of the contest (the points and the multipliers)
+    :type rules: ContestRules
+    :rtype: str
+    :return:
+    """
+
+    # Create the classification - results.csv
+    # -------------------------
+    list_classification_A = []
+    list_classification_B = []
+
+
+    for p in participants:
+        if participants[p].isElectronProgressStation(rules):
+            list_classification_A.append(participants[p].getResultsEP(rules))
+        else:
+            list_classification_B.append(participants[p].getResultsEP(rules))
+
+    writeClassificationElectronProgress(list_classification_A, list_classification_B, to_dir)
+
+    # Write the UBN reports
+    # -------------------------
+    writeUbnReports(participants, to_dir, ubn_callsigns, ubn_archive)
+
+
+def writeClassificationElectronProgress(list_classification_A, list_classification_B, to_dir):
+    """
+    Sorts the results by score and accuracy, adds the rank and writes them into results_A.csv (EP stations) and
+    results_B.csv
+
+    :param list_classification_A: Participant.getResultsEP() of each EP station
+    :type list_classification_A: list of list
+    :param list_classification_B: Participant.getResultsEP() of the other participants
+    :type list_classification_B: list of list
+    :param to_dir: Directory where results must be written
+    """
+    list_classification_A = sorted(list_classification_A,
+                                   key=lambda list_classification_A: (list_classification_A[5], list_classification_A[6]),
+                                   reverse=True)  # Sort by score and then by Accuracy
+
+    list_classification_B = sorted(list_classification_B,
+                                   key=lambda list_classification_B: (
+                                   list_classification_B[5], list_classification_B[6]),
+                                   reverse=True)  # Sort by score and then by Accuracy
+
+    # Add the rank
+    for idx, entry in enumerate(list_classification_A):
+        entry.insert(0, idx+1)
+    for idx, entry in enumerate(list_classification_B):
+        entry.insert(0, idx+1)
+
+    # Print the results into a CSV file called results.csv
+    filename = os.path.join(to_dir, "results_A.csv")
+    with open(filename, "w+", encoding="utf-8") as output:
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerows(list_classification_A)
+
+    filename = os.path.join(to_dir, "results_B.csv")
+    with open(filename, "w+", encoding="utf-8") as output:
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerows(list_classification_B)
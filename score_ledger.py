@@ -0,0 +1,72 @@
+from qso import Qso
+
+
+class ScoreLedger:
+    """
+    Running totals used for the scoring of a single participant.
+
+    The QSOs of the participant notify the ledger whenever their error_code changes (see Qso.ledger), so the counts
+    don't have to be calculated by walking the whole log. The counts don't depend on the contest rules - the points and
+    the multipliers are calculated from them by ContestRules.getPoints() and ContestRules.getMultipliers().
+    """
+
+    def __init__(self):
+        self.valid_count = 0
+        self.invalid_count = 0
+        self.valid_by_mode_freq = {}  #:type : dict of {(mode, freq): number of valid QSOs}
+        # The stations worked with text exchange (e.g. EP) - the multipliers are among them
+        self.worked_text_exchanges = {}  #:type : dict of {(received field, upper-case value): {his_call: valid QSOs}}
+
+
+    def add(self, qso):
+        """
+        Adds a QSO that has been appended to the log
+
+        :type qso: Qso
+        """
+        self.update(qso, None, qso.error_code)
+
+
+    def update(self, qso, old_error_code, new_error_code):
+        """
+        Called when the error code of a QSO changes
+
+        :type qso: Qso
+        :param old_error_code: Previous error code (None if the QSO has just been added)
+        :type old_error_code: int
+        :type new_error_code: int
+        """
+        if old_error_code == Qso.NO_ERROR:
+            self.valid_count -= 1
+            self._count(qso, -1)
+        elif old_error_code is not None:
+            self.invalid_count -= 1
+
+        if new_error_code == Qso.NO_ERROR:
+            self.valid_count += 1
+            self._count(qso, 1)
+        else:
+            self.invalid_count += 1
+
+
+    def _count(self, qso, change):
+        key = (qso.mode, qso.freq)
+        count = self.valid_by_mode_freq.get(key, 0) + change
+        if count:
+            self.valid_by_mode_freq[key] = count
+        else:
+            del self.valid_by_mode_freq[key]
+
+        if type(qso.rcv1) is str:
+            self._countStation(("rcv1", qso.rcv1.upper()), qso.his_call, change)
+        if type(qso.rcv2) is str:
+            self._countStation(("rcv2", qso.rcv2.upper()), qso.his_call, change)
+
+
+    def _countStation(self, exchange, his_call, change):
+        stations = self.worked_text_exchanges.setdefault(exchange, {})
+        count = stations.get(his_call, 0) + change
+        if count:
+            stations[his_call] = count
+        else:
+            del stations[his_call]
@@ -0,0 +1,166 @@
+import os
+import sqlite3
+
+from qso import Qso, formatDate, formatExchange
+from log_index import LogIndex
+from contest_rules import DEFAULT_RULES
+
+SCHEMA = """
+CREATE TABLE participants (
+    callsign TEXT PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    encoding TEXT,
+    total_qsos INTEGER,
+    valid_qsos INTEGER,
+    points INTEGER,
+    accuracy REAL
+);
+CREATE TABLE qsos (
+    id INTEGER PRIMARY KEY,
+    owner TEXT NOT NULL REFERENCES participants(callsign),
+    call TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    freq INTEGER,
+    mode TEXT,
+    time TEXT NOT NULL,
+    snd1 TEXT,
+    snd2 TEXT,
+    his_call TEXT NOT NULL,
+    rcv1 TEXT,
+    rcv2 TEXT,
+    error_code INTEGER NOT NULL,
+    error TEXT NOT NULL,
+    error_info TEXT,
+    partner_id INTEGER REFERENCES qsos(id)
+);
+"""
+
+# Created after the rows are inserted - building an index once is faster than updating it on every insert
+INDEXES = """
+CREATE INDEX qsos_owner ON qsos(owner, position);
+CREATE INDEX qsos_call ON qsos(call, time);
+CREATE INDEX qsos_his_call ON qsos(his_call, time);
+CREATE INDEX qsos_time ON qsos(time);
+CREATE INDEX qsos_error_code ON qsos(error_code, time);
+"""
+
+# The QSOs that were compared with a QSO from the other log
+CROSS_CHECKED = (Qso.NO_ERROR, Qso.ERROR_RECEIVE, Qso.ERROR_PARTNER_RECEIVE)
+
+
+def findPartnerQso(qso, log_index, qso_time_difference, rules=DEFAULT_RULES):
+    """
+    Finds the QSO from the log of his_call that the cross-check compared with (see cross_check.doCrossCheck()):
+    the first one in the time window with matching exchange or else the last one in the time window.
+
+    :type qso: Qso
+    :param log_index: Cross-check index of the logs
+    :type log_index: LogIndex
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param rules: The rules of the contest (the compared exchange)
+    :type rules: ContestRules
+    :return: The QSO from the other log (None if there is no such QSO)
+    :rtype: Qso
+    """
+    candidates = log_index.getCandidates(qso.his_call, qso.call, qso.minute, qso_time_difference+1)
+    for q in candidates:
+        if rules.isReceivedCorrectly(qso, q) and rules.isReceivedCorrectly(q, qso):
+            return q
+    return candidates[-1] if candidates else None
+
+
+def writeSqlite(participants, filename, qso_time_difference=3, log_index=None, rules=DEFAULT_RULES):
+    """
+    Writes all the participants and their checked QSOs into SQLite database (the file is replaced). The QSOs are indexed
+    by owner, call, his_call, time and error_code, e.g. all ERROR_RECEIVE QSOs with LZ0DJ between 0800 and 0830:
+
+    SELECT * FROM qsos WHERE error_code = -4 AND (call = 'LZ0DJ' OR his_call = 'LZ0DJ')
+        AND time BETWEEN '2017-08-19 0800' AND '2017-08-19 0830'
+
+    qsos.owner is the callsign of the log with the QSO (qsos.call is the own call written in the QSO, e.g. LZ0AA/P),
+    qsos.error is the name of qsos.error_code (-4 is ERROR_RECEIVE), qsos.time has the format Qso.DATE_TIME_FORMAT and
+    qsos.partner_id is the QSO from the other log that the QSO was compared with (or linked with, see pair_matching.py).
+
+    :param participants:
+    :type participants: dict of Participant
+    :param filename: Path to the database
+    :type filename: str
+    :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+    :type qso_time_difference: int
+    :param log_index: Cross-check index of the logs. Built from the participants if not supplied.
+    :type log_index: LogIndex
+    :param rules: The rules of the contest (the points and the compared exchange)
+    :type rules: ContestRules
+    """
+    if log_index is None:
+        log_index = LogIndex(participants)
+
+    callsigns = sorted(participants)
+
+    # The ids are known before the insert - the partner QSO can be referenced before its row is written
+    ids = {}
+    for p in callsigns:
+        for qso in participants[p].log:
+            ids[id(qso)] = len(ids) + 1
+
+    # The times and the exchanges repeat in all the logs - each one is formatted once
+    times = {}
+    exchanges = {}
+
+    def formatTime(minute):
+        text = times.get(minute)
+        if text is None:
+            hours, minutes = divmod(minute % 1440, 60)
+            text = times[minute] = formatDate(minute) + " {:02d}{:02d}".format(hours, minutes)
+        return text
+
+    def formatValue(value):
+        text = exchanges.get(value)
+        if text is None:
+            text = exchanges[value] = formatExchange(value)
+        return text
+
+    def getQsoRows():
+        row_id = 0
+        for p in callsigns:
+            for position, qso in enumerate(participants[p].log):
+                row_id += 1
+                error_code = qso.error_code
+                partner = qso.partner  # Linked by --pair_matching
+                if partner is None and error_code in CROSS_CHECKED and qso.his_call in participants:
+                    partner = findPartnerQso(qso, log_index, qso_time_difference, rules)
+                partner_id = ids.get(id(partner)) if partner is not None else None
+
+                yield (row_id, p, qso.call, position, qso.freq, qso.mode, formatTime(qso.minute),
+                       formatValue(qso.snd1), formatValue(qso.snd2), qso.his_call,
+                       formatValue(qso.rcv1), formatValue(qso.rcv2),
+                       error_code, Qso.ERROR_NAMES.get(error_code, "UNKNOWN ERROR"), qso.error_info, partner_id)
+
+    temp_filename = filename + ".tmp"
+    if os.path.exists(temp_filename):
+        os.remove(temp_filename)
+
+    connection = sqlite3.connect(temp_filename)
+    try:
+        # The database is written once into a new file - no journal is needed
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+
+        with connection:  # Single transaction
+            connection.executemany("INSERT INTO participants VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                   ((p, participants[p].name, participants[p].category, participants[p].encoding,
+                                     participants[p].totalQsoCount(), participants[p].validQsoCount(),
+                                     participants[p].getPoints(rules), round(participants[p].getAccuracy(), 2))
+                                    for p in callsigns))
+            connection.executemany("INSERT INTO qsos VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                   getQsoRows())
+
+        connection.executescript(INDEXES)
+        connection.execute("ANALYZE")
+    finally:
+        connection.close()
+
+    os.replace(temp_filename, filename)
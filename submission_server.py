@@ -0,0 +1,284 @@
+import argparse
+import asyncio
+import ipaddress
+import logging
+import os
+import re
+import threading
+from urllib.parse import parse_qs, urlsplit
+
+import logchecker_lzhfqrp
+from busted_calls import HeardIndex, suggestBustedCalls
+from log_index import LogIndex
+from contest_rules import DEFAULT_RULES, loadRules
+
+logger = logging.getLogger(__name__)
+logger.setLevel(level=logging.INFO)
+
+MAX_LOG_SIZE = 5 * 1024 * 1024  # Bigger uploads are refused
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+                411: "Length Required", 413: "Payload Too Large"}
+
+
+class SubmissionService:
+    """
+    Keeps the received logs parsed and indexed in memory and pre-checks each submitted log against them.
+
+    The submitted log is parsed with logchecker_lzhfqrp.parseLog() and checked with the same rules as the full check
+    (see logchecker_lzhfqrp.recheckLogs()). Only the new log and the QSOs of the other logs made with it are checked, so
+    the preliminary UBN is ready within milliseconds.
+
+    The requests are handled in worker threads (see handleConnection()), so a big upload doesn't stop the other
+    clients. The logs are parsed in parallel, the access to the checked logs is serialised by a lock.
+    """
+
+    def __init__(self, participants, start_date_time, end_date_time, qso_repeat_period=30, qso_time_difference=3,
+                 save_dir=None, rules=DEFAULT_RULES):
+        """
+        :param participants: The logs received so far (already checked)
+        :type participants: dict of Participant
+        :param start_date_time: contest start time
+        :param end_date_time: contest end time
+        :param qso_repeat_period: period after which the QSO with the same station is allowed
+        :type qso_repeat_period: int
+        :param qso_time_difference: cross-check allowed difference in minutes between two QSOs
+        :type qso_time_difference: int
+        :param save_dir: If supplied the submitted logs are saved into this directory (as <callsign>.log)
+        :type save_dir: str
+        :param rules: The rules of the contest (the same as of the full check)
+        :type rules: ContestRules
+        """
+        self.participants = participants
+        self.log_index = LogIndex(participants)
+        self.heard = HeardIndex(self.log_index)  # Kept up to date like log_index - the busted calls are proposed from it
+        self.start_date_time = start_date_time
+        self.end_date_time = end_date_time
+        self.qso_repeat_period = qso_repeat_period
+        self.qso_time_difference = qso_time_difference
+        self.save_dir = save_dir
+        self.rules = rules
+        self.lock = threading.Lock()  # Guards participants and log_index
+
+
+    def submit(self, raw, name):
+        """
+        Adds (or replaces) the log and checks it against the other logs
+
+        :param raw: Contents of the cabrillo file
+        :type raw: bytes
+        :param name: Name of the file (used only in the messages)
+        :type name: str
+        :return: The parsed participant (None if the log couldn't be parsed) and the parsing messages
+        :rtype: (Participant, list of str)
+        """
+        participant, messages = logchecker_lzhfqrp.parseLog(name, raw)
+        messages = [message for level, message in messages if level >= logging.WARNING]
+
+        if not len(participant.callsign):
+            messages.append("Couldn't parse the file: " + name + " (CALLSIGN: is missing)")
+            return None, messages
+
+        with self.lock:
+            self.participants[participant.callsign] = participant
+            self.log_index.update(participant)
+            self.heard.update(self.log_index, participant.callsign)
+            rechecked = logchecker_lzhfqrp.recheckLogs(self.participants, {participant.callsign},
+                                                       self.start_date_time, self.end_date_time,
+                                                       self.qso_repeat_period, self.qso_time_difference,
+                                                       self.log_index, rules=self.rules)
+            # The new log can be the busted call only in the logs of the stations it worked. The proposals in the
+            # other logs may be out of date until the full check (e.g. the number of the stations that logged a call).
+            suggestBustedCalls(self.participants, self.qso_time_difference, self.log_index,
+                               rechecked | {qso.his_call for qso in participant.log}, heard=self.heard,
+                               rules=self.rules)
+
+            if self.save_dir is not None:
+                with open(os.path.join(self.save_dir, re.sub(r"[^A-Z0-9]", "_", participant.callsign) + ".log"),
+                          "wb") as f:
+                    f.write(raw)
+
+        logger.info("Received log for: " + participant.callsign + " (" + str(participant.totalQsoCount()) +
+                    " QSOs, " + str(participant.validQsoCount()) + " confirmed so far)")
+        return participant, messages
+
+
+    def getUbnReport(self, callsign):
+        """
+        :return: The current UBN report of the participant (None if no log has been received)
+        :rtype: str
+        """
+        with self.lock:
+            participant = self.participants.get(callsign.upper())
+            if participant is None:
+                return None
+            return participant.getUbnReport()
+
+
+    def handleRequest(self, method, path, body):
+        """
+        POST /submit?name=<filename> - the body is the cabrillo file. Returns the preliminary UBN.
+        GET /ubn/<callsign> - the current UBN (it changes as the other logs arrive)
+        GET / - number of received logs
+
+        Runs in a worker thread (see handleConnection()).
+
+        :return: HTTP status and text of the response
+        :rtype: (int, str)
+        """
+        url = urlsplit(path)
+
+        if url.path == "/submit":
+            if method != "POST":
+                return 405, "Use POST\n"
+            name = parse_qs(url.query).get("name", ["upload"])[0]
+            participant, messages = self.submit(body, name)
+            text = "".join(message if message.endswith("\n") else message + "\n" for message in messages)
+            if participant is None:
+                return 400, text
+            if messages:
+                text += "\n"
+            with self.lock:
+                report = participant.getUbnReport()
+            return 200, text + "PRELIMINARY - the logs of the other stations may still change the result\n\n" + report
+
+        if method != "GET":
+            return 405, "Use GET\n"
+
+        if url.path.startswith("/ubn/"):
+            report = self.getUbnReport(url.path[len("/ubn/"):])
+            if report is None:
+                return 404, "No log received from: " + url.path[len("/ubn/"):] + "\n"
+            return 200, report
+
+        if url.path == "/":
+            return 200, "Received logs: " + str(len(self.participants)) + "\n"
+
+        return 404, "Not found\n"
+
+
+    async def handleConnection(self, reader, writer):
+        """
+        Serves a single HTTP request (the connection is closed after the response)
+        """
+        try:
+            if not isAllowedClient(writer.get_extra_info("peername")[0]):
+                await self._respond(writer, 403, "Only local and LAN clients are allowed\n")
+                return
+
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+
+            if len(request_line) < 2:
+                await self._respond(writer, 400, "Bad request\n")
+                return
+            method, path = request_line[0].upper(), request_line[1]
+
+            body = b""
+            if method == "POST":
+                if "content-length" not in headers:
+                    await self._respond(writer, 411, "Content-Length is required\n")
+                    return
+                length = int(headers["content-length"])
+                if length > MAX_LOG_SIZE:
+                    await self._respond(writer, 413, "The log is too big\n")
+                    return
+                body = await reader.readexactly(length)
+
+            # Parsing and checking a big log takes a while - the event loop keeps serving the other clients
+            status, text = await asyncio.get_running_loop().run_in_executor(None, self.handleRequest, method, path,
+                                                                             body)
+            await self._respond(writer, status, text)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+    async def _respond(self, writer, status, text):
+        data = text.encode("utf-8")
+        writer.write(("HTTP/1.1 " + str(status) + " " + HTTP_REASONS[status] + "\r\n" +
+                      "Content-Type: text/plain; charset=utf-8\r\n" +
+                      "Content-Length: " + str(len(data)) + "\r\n" +
+                      "Connection: close\r\n\r\n").encode("ascii") + data)
+        await writer.drain()
+
+
+def isAllowedClient(address):
+    """
+    :param address: IP address of the client
+    :type address: str
+    :return: True for loopback and private (LAN) addresses
+    :rtype: bool
+    """
+    try:
+        ip = ipaddress.ip_address(address.split("%")[0])
+    except ValueError:
+        return False
+    return ip.is_loopback or ip.is_private or ip.is_link_local
+
+
+async def serve(service, host, port):
+    server = await asyncio.start_server(service.handleConnection, host, port)
+    logger.info("Waiting for logs on http://" + host + ":" + str(port) + "/submit")
+    async with server:
+        await server.serve_forever()
+
+
+def main(start_date, end_date, log_directory, qso_repeat_period_in_mins=30, qso_time_difference_in_mins=3,
+         host="127.0.0.1", port=8080, save=False, jobs=1, rules_filename=None):
+    """
+    Loads and checks the logs that are already received and starts the service
+
+    :param log_directory: Directory with the logs received so far (or zip file with the logs)
+    :type log_directory: str
+    :param host: Address on which the service listens. Use the LAN address (or 0.0.0.0) to accept logs from the LAN.
+    :type host: str
+    :param save: Save the submitted logs into log_directory
+    :type save: bool
+    :param rules_filename: Config file with the rules of the contest (see logchecker_lzhfqrp.main()). The rules of the
+     LZ contests are used if None.
+    :type rules_filename: str
+    """
+    if save and not os.path.isdir(log_directory):
+        raise ValueError("--save requires --dir to be a directory")
+
+    rules = loadRules(rules_filename) if rules_filename is not None else DEFAULT_RULES
+
+    participants = logchecker_lzhfqrp.parseLogs(log_directory, jobs)
+    logchecker_lzhfqrp.checkLog(participants, start_date, end_date, qso_repeat_period_in_mins,
+                                qso_time_difference_in_mins, jobs=jobs, rules=rules)
+
+    service = SubmissionService(participants, start_date, end_date, qso_repeat_period_in_mins,
+                                qso_time_difference_in_mins, log_directory if save else None, rules)
+    suggestBustedCalls(participants, qso_time_difference_in_mins, service.log_index, heard=service.heard,
+                       rules=rules)
+    try:
+        asyncio.run(serve(service, host, port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    logchecker_lzhfqrp.setupLogging()
+
+    parser = argparse.ArgumentParser(description='Pre-checks the submitted logs against the logs received so far.')
+    parser.add_argument("--start", type=str, required=True, help="Contest start time. Example: --start=\"2016-08-20 0800\"")
+    parser.add_argument("--end", type=str, required=True, help="Contest end time. Example: --end=\"2016-08-20 1159\"")
+    parser.add_argument("--dir", type=str, required=True, help="Full path to the directory with the logs received so far. Example: --dir=\"C:\Plovdiv-2016-Logove\"")
+    parser.add_argument("--qso_repeat", type=int, default=30,  required=False, help="QSO repeat interval in minutes. Default is 30mins. Example: --qso_repeat=20")
+    parser.add_argument("--crosscheck_diff", type=int, default=3, required=False, help="Allowed cross-check difference (in minutes) for QSO. Default is 3mins. Example: --crosscheck_diff=4")
+    parser.add_argument("--host", type=str, default="127.0.0.1", required=False, help="Listen address. Only local and LAN clients are served. Default is 127.0.0.1. Example: --host=0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080, required=False, help="Listen port. Default is 8080. Example: --port=8000")
+    parser.add_argument("--save", action="store_true", required=False, help="Save the submitted logs into --dir (as <callsign>.log). Example: --save")
+    parser.add_argument("--jobs", type=int, default=1, required=False, help="Number of worker processes used for the initial check. Default is 1. Example: --jobs=8")
+    parser.add_argument("--rules", type=str, default=None, required=False, help="Config file with the rules of the contest, the same as for logchecker_lzhfqrp.py (see rules_example.ini). Default are the rules of the LZ contests. Example: --rules=\"C:\\rules.ini\"")
+    args = parser.parse_args()
+
+    main(args.start, args.end, args.dir, args.qso_repeat, args.crosscheck_diff, args.host, args.port, args.save,
+         args.jobs, args.rules)